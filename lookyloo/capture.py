@@ -0,0 +1,396 @@
+import json
+import posixpath
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Executor
+from typing import IO, Any
+from urllib.parse import urlsplit, urlunsplit
+
+from redis import Redis
+
+# Capture status codes returned by Lookyloo's status endpoint
+CAPTURE_STATUS_UNKNOWN = -1
+CAPTURE_STATUS_QUEUED = 0
+CAPTURE_STATUS_DONE = 1
+CAPTURE_STATUS_ONGOING = 2
+
+# Phase of the task spent waiting on a capture in each status
+CAPTURE_PHASES = {CAPTURE_STATUS_QUEUED: "capture queued", CAPTURE_STATUS_ONGOING: "capture ongoing"}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Lookyloo registers every finished capture in this hash of its cache instance
+LOOKYLOO_CAPTURE_INDEX_KEY = "lookup_dirs"
+# Sorted sets of the captures queued and ongoing in the Lacus embedded in Lookyloo, in the same instance
+LACUS_QUEUE_KEYS = ("lacus:to_capture", "lacus:ongoing")
+
+
+class CaptureNotifier:
+    """Wake up capture waits when Lookyloo indexes a finished capture.
+
+    Lookyloo keeps its capture index in the local Valkey cache instance. Keyspace notifications on that index are
+    used as a hint that a capture may have completed, the status endpoint remains the source of truth.
+    """
+
+    def __init__(self, socket_path: str) -> None:
+        self._event = threading.Event()
+        self._thread = None
+        self._redis = Redis(unix_socket_path=socket_path)
+        # Keep any keyspace notification already configured on the instance and add hash events
+        current = self._redis.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+        wanted = "".join(sorted(set(current) | {"K", "h"}))
+        if set(wanted) != set(current):
+            self._redis.config_set("notify-keyspace-events", wanted)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{f"__keyspace@0__:{LOOKYLOO_CAPTURE_INDEX_KEY}": self._handle_event})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def _handle_event(self, _message) -> None:
+        self._event.set()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait until a capture is indexed or the timeout expires.
+
+        Args:
+            timeout: Maximum number of seconds to wait.
+
+        Returns:
+            True if a notification was received before the timeout.
+        """
+        notified = self._event.wait(timeout)
+        self._event.clear()
+        return notified
+
+    def close(self) -> None:
+        if self._thread:
+            self._thread.stop()
+            self._thread = None
+        self._pubsub.close()
+        self._redis.close()
+
+
+class CaptureWaiter:
+    """Wait for a Lookyloo capture to complete using an exponential backoff on the status endpoint."""
+
+    def __init__(
+        self,
+        lookyloo,
+        initial_interval: float = 0.1,
+        max_interval: float = 0.5,
+        backoff: float = 1.5,
+        notifier: CaptureNotifier | None = None,
+    ) -> None:
+        self.lookyloo = lookyloo
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.notifier = notifier
+
+    def _now(self) -> float:
+        return time.monotonic()
+
+    def _sleep(self, delay: float) -> None:
+        if self.notifier:
+            self.notifier.wait(delay)
+        else:
+            time.sleep(delay)
+
+    def wait(self, uuid: str, timeout: float, on_status_change: Callable[[int | None, int], None] | None = None) -> int:
+        """Wait for a capture to leave the queued and ongoing states.
+
+        Args:
+            uuid: UUID of the capture to wait for.
+            timeout: Maximum number of seconds to wait for.
+            on_status_change: Called with the previous (None on the first poll) and new status code every time the
+                status changes.
+
+        Returns:
+            The last status code seen, which is still queued or ongoing if the timeout expired.
+        """
+        deadline = self._now() + timeout
+        interval = self.initial_interval
+        previous_status = None
+        while True:
+            status = self.lookyloo.get_status(uuid)["status_code"]
+            if status != previous_status:
+                if on_status_change:
+                    on_status_change(previous_status, status)
+                previous_status = status
+                # A state change means the capture is progressing, check on it closely again
+                interval = self.initial_interval
+
+            if status not in [CAPTURE_STATUS_QUEUED, CAPTURE_STATUS_ONGOING]:
+                return status
+
+            remaining = deadline - self._now()
+            if remaining <= 0:
+                return status
+
+            self._sleep(min(interval, self.max_interval, remaining))
+            interval *= self.backoff
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so equivalent spellings of it compare equal.
+
+    The scheme and host are lowercased, the default port and the fragment are dropped and an empty path becomes ``/``.
+
+    Returns:
+        The normalized URL.
+    """
+    parsed = urlsplit(url)
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc
+    if parsed.hostname:
+        host = f"[{parsed.hostname}]" if ":" in parsed.hostname else parsed.hostname
+        try:
+            port = parsed.port
+        except ValueError:
+            port = None
+        if port and port != DEFAULT_PORTS.get(scheme):
+            host = f"{host}:{port}"
+        userinfo = netloc.rpartition("@")[0]
+        netloc = f"{userinfo}@{host}" if userinfo else host
+    return urlunsplit((scheme, netloc, parsed.path or "/", parsed.query, ""))
+
+
+def capture_cache_key(
+    url: str,
+    proxy: str | None,
+    user_agent: str | None,
+    headers: dict[str, str] | None,
+    viewport: dict[str, Any] | None,
+) -> str:
+    # Everything that changes what the browser would fetch is part of the key
+    return json.dumps(
+        [
+            normalize_url(url),
+            proxy,
+            user_agent,
+            {name.lower(): value for name, value in (headers or {}).items()},
+            viewport,
+        ],
+        sort_keys=True,
+    )
+
+
+class CaptureCache:
+    """Map capture settings to a recent Lookyloo capture.
+
+    Entries expire after the TTL, and the least recently used entries are evicted first when the cache is full.
+    """
+
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            expiry, uuid = self._entries[key]
+            if expiry <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return uuid
+
+    def set(self, key: str, uuid: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, uuid)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class CapturePrefetcher:
+    """Submit follow-up captures ahead of time, so later tasks for these URLs find them in the capture cache.
+
+    At most ``max_inflight`` captures are queued or ongoing at once, counting the one of the task in progress.
+    """
+
+    def __init__(self, lookyloo, cache: CaptureCache, max_inflight: int) -> None:
+        self.lookyloo = lookyloo
+        self.cache = cache
+        self.max_inflight = max_inflight
+        self._inflight: set[str] = set()
+
+    def prefetch(
+        self,
+        urls: list[str],
+        proxy: str | None,
+        user_agent: str | None,
+        headers: dict[str, str] | None,
+        viewport: dict[str, Any] | None,
+    ) -> list[str]:
+        """Submit captures for the given URLs, as long as the in-flight limit allows it.
+
+        Returns:
+            The URLs a capture was submitted for.
+        """
+        self._inflight = {
+            uuid
+            for uuid in self._inflight
+            if self.lookyloo.get_status(uuid)["status_code"] in [CAPTURE_STATUS_QUEUED, CAPTURE_STATUS_ONGOING]
+        }
+        submitted = []
+        for url in urls:
+            if len(self._inflight) >= self.max_inflight - 1:
+                break
+            key = capture_cache_key(url, proxy, user_agent, headers, viewport)
+            if self.cache.get(key):
+                continue
+            uuid = self.lookyloo.submit(
+                quiet=True, url=url, user_agent=user_agent, proxy=proxy, headers=headers, viewport=viewport
+            )
+            self.cache.set(key, uuid)
+            self._inflight.add(uuid)
+            submitted.append(url)
+        return submitted
+
+    @property
+    def inflight(self) -> int:
+        """Number of prefetched captures queued or ongoing when they were last checked."""
+        return len(self._inflight)
+
+
+def lacus_queue_depth(redis: Redis) -> int:
+    """Count the captures queued or ongoing in the Lacus embedded in Lookyloo.
+
+    Returns:
+        The number of captures queued or ongoing.
+    """
+    with redis.pipeline(transaction=False) as pipeline:
+        for key in LACUS_QUEUE_KEYS:
+            pipeline.zcard(key)
+        return sum(pipeline.execute())
+
+
+class CaptureAdmission:
+    """Predict how long a new capture would wait before completing, to only submit the ones with time to complete.
+
+    The prediction assumes the captures ahead are processed ``concurrency`` at a time, each taking about as long as
+    the recent ones did.
+    """
+
+    def __init__(
+        self,
+        queue_depth: Callable[[], int],
+        concurrency: int = 1,
+        capture_estimate: float = 15.0,
+        smoothing: float = 0.2,
+    ) -> None:
+        self.queue_depth = queue_depth
+        self.concurrency = concurrency
+        # Moving average of the time a capture takes once started
+        self.capture_estimate = capture_estimate
+        self.smoothing = smoothing
+
+    def predicted_wait(self) -> tuple[int, float]:
+        """Predict the time until a capture submitted now completes.
+
+        Returns:
+            The number of captures queued or ongoing, and the predicted wait in seconds.
+        """
+        depth = self.queue_depth()
+        return depth, (depth // self.concurrency + 1) * self.capture_estimate
+
+    def observe(self, duration: float) -> None:
+        """Account for the time a capture took once started."""
+        self.capture_estimate += self.smoothing * (duration - self.capture_estimate)
+
+
+class CaptureArchive:
+    """Read the files of a capture exported by Lookyloo without extracting the whole archive.
+
+    Files are looked up by name, wherever the export placed them. If several files share a name, the one closest to
+    the root of the archive is used.
+    """
+
+    def __init__(self, archive: IO[bytes]) -> None:
+        self._zip = zipfile.ZipFile(archive)
+        self._members: dict[str, zipfile.ZipInfo] = {}
+        for info in self._zip.infolist():
+            if info.is_dir():
+                continue
+            name = posixpath.basename(info.filename)
+            if name not in self._members or info.filename.count("/") < self._members[name].filename.count("/"):
+                self._members[name] = info
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._members
+
+    def __enter__(self) -> "CaptureArchive":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def open(self, name: str) -> IO[bytes]:
+        if name not in self._members:
+            raise KeyError(f"There is no {name} in the capture")
+        return self._zip.open(self._members[name])
+
+    def read(self, name: str) -> bytes:
+        with self.open(name) as f:
+            return f.read()
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class FetchedCapture:
+    """Everything retrieved from Lookyloo about a completed capture."""
+
+    def __init__(
+        self,
+        files: CaptureArchive,
+        stats: dict[str, Any],
+        cookies: list[dict[str, Any]],
+        redirects: dict[str, Any],
+        timings: dict[str, float],
+    ) -> None:
+        self.files = files
+        self.stats = stats
+        self.cookies = cookies
+        self.redirects = redirects
+        self.timings = timings
+
+
+def timed(function: Callable[[], Any]) -> tuple[Any, float]:
+    start = time.monotonic()
+    return function(), time.monotonic() - start
+
+
+class CaptureFetcher:
+    """Fetch a completed capture from Lookyloo, running every request concurrently and timing it.
+
+    The stats, cookies and redirects come from their own endpoints, the files from the complete export. PyLookyloo
+    has no endpoint for the HAR and the favicon, so fetching the other files on their own would not spare the export.
+    """
+
+    def __init__(self, lookyloo, pool: Executor) -> None:
+        self.lookyloo = lookyloo
+        self.pool = pool
+
+    def fetch(self, uuid: str) -> FetchedCapture:
+        fetches = {
+            "stats": lambda: self.lookyloo.get_capture_stats(uuid),
+            "cookies": lambda: self.lookyloo.get_cookies(uuid),
+            "redirects": lambda: self.lookyloo.get_redirects(uuid),
+            "export": lambda: CaptureArchive(self.lookyloo.get_complete_capture(uuid)),
+        }
+        futures = {name: self.pool.submit(timed, fetch) for name, fetch in fetches.items()}
+        results = {name: future.result()[0] for name, future in futures.items()}
+        timings = {name: future.result()[1] for name, future in futures.items()}
+
+        return FetchedCapture(results["export"], results["stats"], results["cookies"], results["redirects"], timings)
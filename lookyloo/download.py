@@ -0,0 +1,99 @@
+import hashlib
+from collections.abc import Iterable
+from http.cookiejar import DefaultCookiePolicy
+from typing import IO, Any
+
+import requests
+
+from lookyloo.har import DIGEST_ALGORITHMS
+
+# Chunks read from a streamed response, large enough to keep the per-chunk overhead low
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def cookieless_session() -> requests.Session:
+    """Create a session which reuses its connections, but never keeps the cookies servers set.
+
+    The cookies given with a request, and the ones set along its redirects, are still sent.
+
+    Returns:
+        The session, without any cookie.
+    """
+    session = requests.Session()
+    # No domain is allowed to store a cookie in the session
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def write_content(
+    chunks: Iterable[bytes],
+    destination: IO[bytes],
+    max_size: int | None = None,
+    algorithms: tuple[str, ...] = DIGEST_ALGORITHMS,
+) -> dict[str, Any]:
+    """Write a body to a file as it is received, hashing it on the way.
+
+    Args:
+        chunks: The body, as it is received.
+        destination: Binary file the body is written to.
+        max_size: Number of bytes after which the body is cut, and the rest of it not read.
+        algorithms: Hash algorithms to compute over the written body.
+
+    Returns:
+        The hexadecimal digest for each algorithm, the size of the written body, and whether it was truncated.
+    """
+    digests = [hashlib.new(algorithm) for algorithm in algorithms]
+    size = 0
+    truncated = False
+    for chunk in chunks:
+        if max_size is not None and size + len(chunk) > max_size:
+            chunk = chunk[: max_size - size]
+            truncated = True
+        for digest in digests:
+            digest.update(chunk)
+        destination.write(chunk)
+        size += len(chunk)
+        if truncated:
+            break
+
+    result = {algorithm: digest.hexdigest() for algorithm, digest in zip(algorithms, digests)}
+    result["size"] = size
+    result["truncated"] = truncated
+    return result
+
+
+class DiskBudget:
+    """Account for the bytes a task writes to its working directory.
+
+    A budget of 0 bytes is unlimited.
+    """
+
+    def __init__(self, max_bytes: int = 0) -> None:
+        self.max_bytes = max_bytes
+        self.used = 0
+
+    @property
+    def remaining(self) -> int | None:
+        return max(0, self.max_bytes - self.used) if self.max_bytes else None
+
+    def fits(self, size: int) -> bool:
+        return not self.max_bytes or self.used + size <= self.max_bytes
+
+    def spend(self, size: int) -> None:
+        self.used += size
+
+
+class ChargedWriter:
+    """Write text to a file, spending the size of what is written from a disk budget.
+
+    What is written is charged before any compression of the file, so compressed files are charged their
+    uncompressed size.
+    """
+
+    def __init__(self, destination: IO[str], budget: DiskBudget) -> None:
+        self.destination = destination
+        self.budget = budget
+
+    def write(self, text: str) -> int:
+        self.budget.spend(len(text.encode()))
+        return self.destination.write(text)
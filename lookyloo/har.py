@@ -0,0 +1,153 @@
+import base64
+import binascii
+import gzip
+import hashlib
+import json
+from collections.abc import Iterator
+from typing import IO, Any
+
+import ijson
+
+CONTAINER_START_EVENTS = ["start_map", "start_array"]
+CONTAINER_END_EVENTS = ["end_map", "end_array"]
+
+DIGEST_ALGORITHMS = ("md5", "sha1", "sha256")
+
+# How the rewritten HAR can be compressed as it is written
+HAR_COMPRESSIONS = ["none", "gzip"]
+
+# Response bodies are decoded by slices of this many characters, a multiple of 4 to keep base64 quanta aligned
+CONTENT_CHUNK_SIZE = 256 * 1024
+
+
+def _build_value(events: Iterator[tuple[str, str, Any]], first_event: tuple[str, str, Any]) -> Any:
+    # Rebuild a single JSON value from the parser events, starting with an event already consumed
+    builder = ijson.ObjectBuilder()
+    depth = 0
+    event = first_event
+    while True:
+        _, event_type, value = event
+        builder.event(event_type, value)
+        if event_type in CONTAINER_START_EVENTS:
+            depth += 1
+        elif event_type in CONTAINER_END_EVENTS:
+            depth -= 1
+        if depth == 0:
+            return builder.value
+        event = next(events)
+
+
+class HarRewriter:
+    """Stream the entries of a HAR file while writing a rewritten copy of it.
+
+    Only one entry is held in memory at a time. Each entry is written to the destination once the consumer is done
+    with it, so it can be modified in place. All the other fields of the ``log`` object are kept in ``log``, which is
+    only complete once every entry has been consumed.
+    """
+
+    def __init__(self, source: IO[bytes], destination: IO[str]) -> None:
+        self.source = source
+        self.destination = destination
+        self.log: dict[str, Any] = {}
+
+    def entries(self) -> Iterator[dict[str, Any]]:
+        events = ijson.parse(self.source, use_float=True)
+        self.destination.write('{"log": {')
+        separator = ""
+        for prefix, event_type, value in events:
+            if prefix != "log" or event_type != "map_key":
+                continue
+
+            self.destination.write(f"{separator}{json.dumps(value)}: ")
+            separator = ", "
+            first_event = next(events)
+            if value == "entries" and first_event[1] == "start_array":
+                yield from self._entries(events)
+            else:
+                self.log[value] = _build_value(events, first_event)
+                self.destination.write(json.dumps(self.log[value]))
+        self.destination.write("}}")
+
+    def _entries(self, events: Iterator[tuple[str, str, Any]]) -> Iterator[dict[str, Any]]:
+        self.destination.write("[")
+        separator = ""
+        for event in events:
+            if event[1] == "end_array":
+                break
+            entry = _build_value(events, event)
+            yield entry
+            self.destination.write(f"{separator}{json.dumps(entry)}")
+            separator = ", "
+        self.destination.write("]")
+
+
+def open_har_output(path: str, compression: str = "none", level: int = 6) -> IO[str]:
+    """Open the file a rewritten HAR is written to, compressing it on the way.
+
+    Args:
+        path: Path of the file, without the extension of the compression.
+        compression: One of ``HAR_COMPRESSIONS``.
+        level: Compression level, from 1 (fastest) to 9 (smallest).
+
+    Returns:
+        The file, open for writing text.
+
+    Raises:
+        ValueError: If the compression is not one of ``HAR_COMPRESSIONS``.
+    """
+    if compression == "gzip":
+        return gzip.open(f"{path}.gz", "wt", compresslevel=level, encoding="utf-8")
+    if compression == "none":
+        return open(path, "w", encoding="utf-8")
+    raise ValueError(f"Unknown HAR compression {compression}, it should be one of {', '.join(HAR_COMPRESSIONS)}")
+
+
+def _iter_content_chunks(content_text: str, encoding: str | None) -> Iterator[bytes]:
+    if encoding == "base64":
+        for offset in range(0, len(content_text), CONTENT_CHUNK_SIZE):
+            yield binascii.a2b_base64(content_text[offset : offset + CONTENT_CHUNK_SIZE], strict_mode=True)
+    else:
+        for offset in range(0, len(content_text), CONTENT_CHUNK_SIZE):
+            yield content_text[offset : offset + CONTENT_CHUNK_SIZE].encode()
+
+
+def decode_content(
+    content_text: str,
+    encoding: str | None,
+    destination: IO[bytes] | None = None,
+) -> dict[str, Any]:
+    """Decode a HAR response body, hashing it and optionally writing it in a single pass.
+
+    Args:
+        content_text: The ``text`` of the response content.
+        encoding: The ``encoding`` of the response content.
+        destination: Binary file the decoded body is written to.
+
+    Returns:
+        The hexadecimal digest for each algorithm, and the size of the decoded body.
+    """
+    digests = [hashlib.new(algorithm) for algorithm in DIGEST_ALGORITHMS]
+    size = 0
+    try:
+        for chunk in _iter_content_chunks(content_text, encoding):
+            for digest in digests:
+                digest.update(chunk)
+            if destination:
+                destination.write(chunk)
+            size += len(chunk)
+    except binascii.Error:
+        # Not strictly valid base64, fall back to decoding it whole, or to the raw text if that fails too
+        try:
+            content = base64.b64decode(content_text)
+        except Exception:
+            content = content_text.encode()
+        digests = [hashlib.new(algorithm, content) for algorithm in DIGEST_ALGORITHMS]
+        size = len(content)
+        if destination:
+            destination.seek(0)
+            destination.truncate()
+            destination.write(content)
+
+    result = {algorithm: digest.hexdigest() for algorithm, digest in zip(DIGEST_ALGORITHMS, digests)}
+    result["size"] = size
+    return result
@@ -0,0 +1,120 @@
+import hashlib
+import io
+import math
+
+from PIL import Image
+
+# Width and height of the difference hash, which is width * height bits long
+DHASH_SIZE = 8
+# Rounds of downsampling to get a screenshot under the maximum size, each one estimated from the previous one
+MAX_RESIZE_ROUNDS = 3
+# Errors Pillow raises on images it cannot, or will not, decode
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def dhash(image: Image.Image, size: int = DHASH_SIZE) -> str:
+    """Compute the difference hash of an image, which stays close for images looking alike.
+
+    Returns:
+        The hash as an hexadecimal string, comparable with the Hamming distance of the bits.
+    """
+    # Shrinking before dropping the colours saves converting every pixel of large images
+    pixels = image.resize((size + 1, size), Image.Resampling.BOX).convert("L").tobytes()
+    value = 0
+    for row in range(size):
+        for column in range(size):
+            offset = row * (size + 1) + column
+            value = value << 1 | (pixels[offset] > pixels[offset + 1])
+    return f"{value:0{size * size // 4}x}"
+
+
+class ProcessedImage:
+    """A screenshot as written for the result, and its difference hash."""
+
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        # Size in bytes of the written file
+        self.size = size
+        self.dhash: str | None = None
+        self.dimensions: tuple[int, int] | None = None
+        # Dimensions of the screenshot before it was downsampled, None if it was written as is
+        self.original_dimensions: tuple[int, int] | None = None
+
+
+def process_screenshot(data: bytes, path: str, max_dimension: int = 0, max_size: int = 0) -> ProcessedImage:
+    """Hash a screenshot and write it, downsampled if it is larger than allowed.
+
+    The screenshot is decoded once, from memory. Screenshots which cannot be decoded are written as is.
+
+    Args:
+        data: The screenshot.
+        path: Path to write the screenshot to.
+        max_dimension: Largest width or height of the written screenshot, 0 for no limit.
+        max_size: Largest size in bytes of the written screenshot, 0 for no limit.
+
+    Returns:
+        Where the screenshot was written, and what it looks like.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except IMAGE_ERRORS:
+        with open(path, "wb") as f:
+            f.write(data)
+        return ProcessedImage(path, len(data))
+
+    if image.mode in ("1", "P"):
+        # Palette images can only be resized pixel by pixel
+        image = image.convert("RGBA")
+    processed = ProcessedImage(path, len(data))
+    processed.dhash = dhash(image)
+    processed.dimensions = image.size
+
+    scale = 1.0
+    if max_dimension and max(image.size) > max_dimension:
+        scale = max_dimension / max(image.size)
+    if max_size and len(data) > max_size:
+        # The encoded size roughly follows the number of pixels
+        scale = min(scale, math.sqrt(max_size / len(data)))
+    if scale >= 1:
+        with open(path, "wb") as f:
+            f.write(data)
+        return processed
+
+    processed.original_dimensions = image.size
+    encoded = data
+    for _ in range(MAX_RESIZE_ROUNDS):
+        dimensions = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        resized = image.resize(dimensions, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        output = io.BytesIO()
+        resized.save(output, format="PNG")
+        encoded = output.getvalue()
+        processed.dimensions = dimensions
+        if not max_size or len(encoded) <= max_size:
+            break
+        scale *= math.sqrt(max_size / len(encoded))
+
+    with open(path, "wb") as f:
+        f.write(encoded)
+    processed.size = len(encoded)
+    return processed
+
+
+def favicon_info(data: bytes) -> dict[str, str | int]:
+    """Hash a favicon, both its content and what it looks like.
+
+    Returns:
+        The file information of the favicon, with its difference hash when it can be decoded.
+    """
+    info: dict[str, str | int] = {
+        "md5": hashlib.md5(data).hexdigest(),
+        "sha1": hashlib.sha1(data).hexdigest(),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "size": len(data),
+    }
+    try:
+        image = Image.open(io.BytesIO(data))
+        info["dhash"] = dhash(image.convert("RGBA") if image.mode in ("1", "P") else image)
+    except IMAGE_ERRORS:
+        pass
+    return info
@@ -1,18 +1,19 @@
-import base64
 import gzip
+import io
 import json
 import os
 import re
-import subprocess
 import tempfile
-import xml.etree.ElementTree as ET
-import zipfile
-from time import sleep
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from functools import partial
 from urllib.parse import urlparse
 
 import pylookyloo
-import requests
 import yaml
+from assemblyline.common.exceptions import RecoverableError
 from assemblyline.common.identify import Identify
 from assemblyline.odm.models.ontology.results.http import HTTP as HTTPResult
 from assemblyline.odm.models.ontology.results.network import NetworkConnection
@@ -32,43 +33,83 @@ from assemblyline_v4_service.common.result import (
     TableSectionBody,
 )
 from assemblyline_v4_service.common.task import PARENT_RELATION
-from bs4 import BeautifulSoup
+from redis import Redis
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError, TooManyRedirects
 
+from lookyloo.capture import (
+    CAPTURE_PHASES,
+    CAPTURE_STATUS_DONE,
+    CAPTURE_STATUS_ONGOING,
+    CAPTURE_STATUS_QUEUED,
+    LACUS_QUEUE_KEYS,
+    CaptureAdmission,
+    CaptureCache,
+    CaptureFetcher,
+    CaptureNotifier,
+    CapturePrefetcher,
+    CaptureWaiter,
+    capture_cache_key,
+    lacus_queue_depth,
+)
+from lookyloo.download import DOWNLOAD_CHUNK_SIZE, ChargedWriter, DiskBudget, cookieless_session, write_content
+from lookyloo.har import HAR_COMPRESSIONS, HarRewriter, decode_content, open_har_output
+from lookyloo.images import favicon_info, process_screenshot
+from lookyloo.matching import UrlMatcher
+from lookyloo.ontology import ONTOLOGY_MODES, ConnectionCollector
+from lookyloo.page import (
+    HTML_MIME_TYPES,
+    XML_MIME_TYPES,
+    ScannedPage,
+    content_charset,
+    find_webdav_links,
+    scan_html,
+)
+from lookyloo.redirects import RedirectGraph, find_header
+from lookyloo.safelist import SafelistCache
+from lookyloo.startup import configure_lookyloo, read_lookyloo_version, start_lookyloo, wait_until_ready
+from lookyloo.timing import PhaseHistogram, PhaseTimer
+
 # Regex from
 # https://stackoverflow.com/questions/40939380/how-to-get-file-name-from-content-disposition
 # Many tests can be found at http://test.greenbytes.de/tech/tc2231/
-UTF8_FILENAME_REGEX = r"filename\*=UTF-8''([\w%\-\.]+)(?:; ?|$)"
-ASCII_FILENAME_REGEX = r"filename=([\"']?)(.*?[^\\])\1(?:; ?|$)"
+UTF8_FILENAME_REGEX = re.compile(r"filename\*=UTF-8''([\w%\-\.]+)(?:; ?|$)")
+ASCII_FILENAME_REGEX = re.compile(r"filename=([\"']?)(.*?[^\\])\1(?:; ?|$)")
 
 
-def detect_open_directory(request: ServiceRequest, soup: BeautifulSoup):
-    if not soup.title or "index of" not in soup.title.string.lower():
-        return
+def detect_open_directory(request: ServiceRequest, page: ScannedPage, url: str | None = None):
+    if not page.is_directory_listing:
+        return []
+
+    # The listing is the submitted URL, unless it was found in another document of the capture
+    url = url or request.task.fileinfo.uri_info.uri
 
     open_directory_links = []
     open_directory_folders = []
-    for a in soup.find_all("a", href=True):
-        if "://" in a["href"][:10] and a["href"][0] != ".":
+    for href in page.hrefs:
+        if "://" in href[:10] and href[0] != ".":
             continue
-        if a["href"] == "..":
+        if href == "..":
             # Link to the parent directory
             continue
-        if a["href"][0] == "?":
+        if href[0] == "?":
             # Probably just some table ordering
             continue
-        if a["href"][0] == "/":
+        if href[0] == "/":
             # Check if it is the root or a parent directory
-            if a["href"] == "/" or request.task.fileinfo.uri_info.path.startswith(a["href"]):
+            if href == "/" or urlparse(url).path.startswith(href):
                 continue
 
-        if a["href"].endswith("/"):
-            open_directory_folders.append(a["href"])
+        if href.endswith("/"):
+            open_directory_folders.append(href)
         else:
-            open_directory_links.append(a["href"])
+            open_directory_links.append(href)
 
+    listed_urls = []
     if open_directory_links or open_directory_folders:
         open_directory_section = ResultTextSection("Open Directory Detected", parent=request.result)
+        if url != request.task.fileinfo.uri_info.uri:
+            open_directory_section.add_line(f"Listing: {url}")
         if open_directory_links:
             open_directory_section.add_line(f"File{'s' if len(open_directory_links) > 1 else ''}:")
 
@@ -76,9 +117,10 @@ def detect_open_directory(request: ServiceRequest, soup: BeautifulSoup):
             # Append the full website, remove the '.' from the link
             while link[:2] == "./":
                 link = link[2:]
-            link = f"{request.task.fileinfo.uri_info.uri.rstrip('/')}/{link}"
+            link = f"{url.rstrip('/')}/{link}"
             open_directory_section.add_line(link)
             add_tag(open_directory_section, "network.static.uri", link)
+            listed_urls.append(link)
 
         if open_directory_folders:
             open_directory_section.add_line(f"Folder{'s' if len(open_directory_folders) > 1 else ''}:")
@@ -87,25 +129,20 @@ def detect_open_directory(request: ServiceRequest, soup: BeautifulSoup):
             # Append the full website, remove the '.' from the link
             while link[:2] == "./":
                 link = link[2:]
-            link = f"{request.task.fileinfo.uri_info.uri.rstrip('/')}/{link}"
+            link = f"{url.rstrip('/')}/{link}"
             open_directory_section.add_line(link)
             add_tag(open_directory_section, "network.static.uri", link)
+            listed_urls.append(link)
 
+    return listed_urls
 
-def detect_webdav_listing(request: ServiceRequest, content: bytes):
-    root = ET.fromstring(content)
-    namespace = {"d": "DAV:"}
-    links = []
-    for response in root.findall("d:response", namespace):
-        href = response.find("d:href", namespace)
-        if href is not None:
-            links.append(href.text)
 
+def detect_webdav_listing(request: ServiceRequest, links: list[str], url: str):
     if not links:
         return
 
     webdav_section = ResultTextSection("WebDav Listing Detected", parent=request.result)
-    root_url = urlparse(request.task.fileinfo.uri_info.uri)
+    root_url = urlparse(url)
     root_url = root_url._replace(fragment="")._replace(params="")._replace(query="")._replace(path="").geturl()
     for link in links:
         # Append the root website
@@ -114,41 +151,149 @@ def detect_webdav_listing(request: ServiceRequest, content: bytes):
         add_tag(webdav_section, "network.static.uri", link)
 
 
-def parse_refresh_header(header_value):
-    try:
-        refresh = header_value.split(";", 1)
-        if int(refresh[0]) <= 15 and refresh[1].startswith("url="):
-            return refresh[1][4:]
-    except Exception:
-        # Maybe log that we weren't able to parse the refresh
-        pass
-    return ""
-
-
 class Lookyloo(ServiceBase):
     def start(self):
-        self.identify = Identify(use_cache=False)
-        self.lookyloo = pylookyloo.Lookyloo(root_url="http://127.0.0.1:5100")
-        self.lookyloo_version = (
-            subprocess.run(
-                ["poetry", "run", "python", "-c", "from importlib.metadata import version; print(version('lookyloo'))"],
-                cwd="/opt/lookyloo",
-                capture_output=True,
-                check=False,
+        # Settings only used once a capture is fetched are checked now, rather than failing every task after its capture
+        ontology_mode = self.config.get("ontology_mode", "full")
+        if ontology_mode not in ONTOLOGY_MODES:
+            raise ValueError(f"Unknown ontology mode {ontology_mode}, it should be one of {', '.join(ONTOLOGY_MODES)}")
+        har_compression = self.config.get("har_compression", "none")
+        if har_compression not in HAR_COMPRESSIONS:
+            raise ValueError(
+                f"Unknown HAR compression {har_compression}, it should be one of {', '.join(HAR_COMPRESSIONS)}"
             )
-            .stdout.strip()
-            .decode("UTF8", errors="backslashreplace")
+        self.identify = Identify(use_cache=False)
+        # Identify does its own locking around libmagic, the rest can run alongside the HAR processing
+        self.identify_pool = ThreadPoolExecutor(
+            max_workers=self.config.get("identify_workers", 1), thread_name_prefix="identify"
+        )
+        # The HTML and XML documents of the capture are parsed alongside the rest of the session log processing
+        self.document_pool = ThreadPoolExecutor(
+            max_workers=self.config.get("document_workers", 2), thread_name_prefix="document"
         )
-        self.do_not_download_regexes = [re.compile(x) for x in self.config.get("do_not_download_regexes", [])]
+        self.lookyloo = pylookyloo.Lookyloo(root_url=self.config.get("lookyloo_url", "http://127.0.0.1:5100"))
+        # Keep enough keep-alive connections to the local Lookyloo for all the concurrent requests
+        lookyloo_connections = self.config.get("lookyloo_connections", 8)
+        self.lookyloo.session.mount(
+            "http://",
+            HTTPAdapter(
+                pool_maxsize=lookyloo_connections,
+                max_retries=self.lookyloo.session.get_adapter("http://").max_retries,
+            ),
+        )
+        timer = PhaseTimer()
+        self.lookyloo_version = read_lookyloo_version()
+        timer.lap("version")
+        self.do_not_download = UrlMatcher(self.config.get("do_not_download_regexes", []))
         if not self.lookyloo.is_up:
-            subprocess.run("poetry run start".split(), cwd="/opt/lookyloo")
-            while not self.lookyloo.is_up:
-                sleep(1)
-                self.log.info("Waiting for Lookyloo to be up")
+            if lookyloo_settings := self.config.get("lookyloo_settings"):
+                if unknown := configure_lookyloo(lookyloo_settings):
+                    self.log.warning(
+                        f"Ignoring the settings unknown to Lookyloo {self.lookyloo_version}: {', '.join(unknown)}"
+                    )
+                timer.lap("configure")
+            start_lookyloo()
+            timer.lap("launch")
+            wait_until_ready(
+                lambda: self.lookyloo.is_up,
+                self.config.get("lookyloo_startup_timeout", 300),
+                on_wait=lambda waited: self.log.info(f"Waiting for Lookyloo to be up ({waited:.0f}s)"),
+            )
+        timer.lap("ready")
+        self.log.info(f"Lookyloo {self.lookyloo_version} started: {timer}")
+
+        self.capture_notifier = None
+        socket_path = "/opt/lookyloo/cache/cache.sock"
+        if self.config.get("capture_notifications", True) and os.path.exists(socket_path):
+            try:
+                self.capture_notifier = CaptureNotifier(socket_path)
+            except Exception as e:
+                self.log.warning(f"Unable to subscribe to capture notifications, falling back to polling: {e}")
+        self.lookyloo_pool = ThreadPoolExecutor(max_workers=lookyloo_connections, thread_name_prefix="lookyloo")
+        self.capture_fetcher = CaptureFetcher(self.lookyloo, self.lookyloo_pool)
+        self.capture_cache = None
+        if self.config.get("capture_cache_ttl", 0) > 0:
+            self.capture_cache = CaptureCache(
+                self.config["capture_cache_ttl"], self.config.get("capture_cache_max_entries", 256)
+            )
+        self.capture_prefetcher = None
+        if self.capture_cache and self.config.get("max_inflight_captures", 1) > 1:
+            self.capture_prefetcher = CapturePrefetcher(
+                self.lookyloo, self.capture_cache, self.config["max_inflight_captures"]
+            )
+        # The Lacus embedded in Lookyloo keeps its queue in the same cache instance
+        self.lacus_redis = Redis(unix_socket_path=socket_path) if os.path.exists(socket_path) else None
+        # Captures are only submitted when they are predicted to complete before the service timeout
+        self.capture_admission = None
+        if self.config.get("admission_control", True):
+            if self.lacus_redis:
+                queue_depth = partial(lacus_queue_depth, self.lacus_redis)
+            elif self.capture_prefetcher:
+                # Without access to the queue of Lookyloo, only the captures submitted by this service are known
+                queue_depth = lambda: self.capture_prefetcher.inflight
+            else:
+                queue_depth = lambda: 0
+            self.capture_admission = CaptureAdmission(
+                queue_depth,
+                concurrency=self.config.get("admission_concurrent_captures", 1),
+                capture_estimate=self.config.get("admission_capture_estimate", 15.0),
+            )
+        self.capture_waiter = CaptureWaiter(
+            self.lookyloo,
+            initial_interval=self.config.get("capture_poll_initial_interval", 0.1),
+            # Notifications wake the wait up, polling is only a safety net
+            max_interval=(
+                self.config.get("capture_poll_max_interval_notified", 5.0)
+                if self.capture_notifier
+                else self.config.get("capture_poll_max_interval", 0.5)
+            ),
+            backoff=self.config.get("capture_poll_backoff", 1.5),
+            notifier=self.capture_notifier,
+        )
+
+        # Verdicts on the content extracted, shared by every task of the process
+        self.safelist = self.api_interface
+        if self.config.get("safelist_cache_ttl", 0) > 0:
+            self.safelist = SafelistCache(
+                self.api_interface,
+                self.config["safelist_cache_ttl"],
+                self.config.get("safelist_cache_max_entries", 100000),
+                self.config.get("safelist_cache_path") or None,
+            )
 
-    def send_http_request(self, method, request: ServiceRequest, data: dict):
+        self.phase_histogram = PhaseHistogram()
+        self.http_sessions = {}
+
+    def stop(self):
+        if self.capture_notifier:
+            self.capture_notifier.close()
+        self.identify_pool.shutdown(cancel_futures=True)
+        self.document_pool.shutdown(cancel_futures=True)
+        self.lookyloo_pool.shutdown(cancel_futures=True)
+        for session in self.http_sessions.values():
+            session.close()
+        if isinstance(self.safelist, SafelistCache):
+            self.safelist.close()
+        if self.lacus_redis:
+            self.lacus_redis.close()
+
+    def _analyse_document(self, scan, path):
+        with open(path, "rb") as f:
+            return scan(f.read())
+
+    def _identify_type(self, path):
+        # The hashes are already known, identify the type from the beginning of the file only
+        return self.identify.fileinfo(path, generate_hashes=False, skip_fuzzy_hashes=True, calculate_entropy=False)
+
+    def _http_session(self, proxy: str):
+        # Connections are kept alive across tasks, separately for each proxy, the cookies of one task are not
+        if proxy not in self.http_sessions:
+            self.http_sessions[proxy] = cookieless_session()
+        return self.http_sessions[proxy]
+
+    def send_http_request(self, method, request: ServiceRequest, data: dict, disk_budget: DiskBudget):
         try:
-            with requests.request(
+            with self._http_session(request.get_param("proxy")).request(
                 method,
                 request.task.fileinfo.uri_info.uri,
                 headers=data.get("headers", {}),
@@ -158,20 +303,32 @@ class Lookyloo(ServiceBase):
                 cookies=data.get("cookies", None),
                 stream=True,
             ) as r:
-
+                max_size = self.config.get("max_download_size")
+                if disk_budget.max_bytes:
+                    # The content past the disk budget of the task is not downloaded either
+                    max_size = min(max_size or disk_budget.remaining, disk_budget.remaining)
                 requests_content_path = os.path.join(self.working_directory, "requests_content")
                 with open(requests_content_path, "wb") as f:
+                    content_info = write_content(
+                        r.iter_content(self.config.get("download_chunk_size", DOWNLOAD_CHUNK_SIZE)), f, max_size
+                    )
+                disk_budget.spend(content_info["size"])
+
+                if content_info.pop("truncated"):
+                    # The rest of the content is never read, the connection is dropped when the response is closed
+                    request.partial()
+                    truncated_section = ResultTextSection("Content truncated", parent=request.result)
+                    truncated_section.add_line(
+                        f"Only the first {content_info['size']} bytes of the content were downloaded."
+                    )
 
-                    for chunk in r.iter_content(None):
-                        f.write(chunk)
-
-                return requests_content_path
+                return requests_content_path, content_info
 
         except ConnectionError:
             error_section = ResultTextSection("Error", parent=request.result)
             error_section.add_line(f"Cannot connect to {request.task.fileinfo.uri_info.hostname}")
             error_section.add_line("This server is currently unavailable")
-            return None
+            return None, None
         except TooManyRedirects as e:
             request.partial()
             error_section = ResultTextSection("Too many redirects", parent=request.result)
@@ -182,9 +339,113 @@ class Lookyloo(ServiceBase):
                 redirect_section.add_row(TableRow({"status": redirect.status_code, "redirecting_url": redirect.url}))
                 add_tag(redirect_section, "network.static.uri", redirect.url)
             redirect_section.set_column_order(["status", "redirecting_url"])
-            return None
+            return None, None
+
+    def _report_timing(self, request: ServiceRequest, timer: PhaseTimer):
+        timing_section = ResultKeyValueSection("Timing", auto_collapse=True, parent=request.result)
+        for phase, duration in {**timer.phases, **timer.details}.items():
+            timing_section.set_item(phase, round(duration, 3))
+        timing_section.set_item("total", round(timer.total, 3))
+        self.log.info(f"Processed {request.task.fileinfo.uri_info.uri} in {timer.total:.2f}s: {timer}")
+
+        # There is no metrics surface for services, periodically log the distribution of the phase durations instead
+        self.phase_histogram.observe({**timer.phases, **timer.details, "total": timer.total})
+        interval = self.config.get("timing_log_interval", 100)
+        if interval and self.phase_histogram.tasks % interval == 0:
+            self.log.info(f"Phase durations over {self.phase_histogram.tasks} tasks: {self.phase_histogram.summary()}")
+            if isinstance(self.safelist, SafelistCache):
+                self.log.info(
+                    f"Safelist cache hit rate: {self.safelist.hit_rate:.1%} "
+                    f"({self.safelist.hits} hits, {self.safelist.misses} misses)"
+                )
+
+    def _capture_time_left(self, start_time):
+        # Time left for a capture to complete, keeping some of the service timeout to process it
+        return (
+            self.service_attributes.timeout
+            - self.config.get("capture_processing_reserve", 20)
+            - (time.monotonic() - start_time)
+        )
+
+    def _admit_capture(self, request: ServiceRequest, start_time, timer):
+        if not self.capture_admission:
+            return True
+        try:
+            depth, predicted_wait = self.capture_admission.predicted_wait()
+        except Exception as e:
+            self.log.warning(f"Unable to get the depth of the capture queue, submitting anyway: {e}")
+            return True
+        finally:
+            timer.lap("capture admission")
+
+        remaining_time = self._capture_time_left(start_time)
+        if predicted_wait <= remaining_time:
+            return True
+
+        message = (
+            f"{depth} captures are queued or ongoing, a new one would take about {predicted_wait:.0f}s to complete "
+            f"while only {remaining_time:.0f}s are left."
+        )
+        self.log.warning(f"Not capturing {request.task.fileinfo.uri_info.uri}: {message}")
+        if self.config.get("admission_action", "partial") == "requeue":
+            # The task is retried later, hopefully once the queue has drained
+            raise RecoverableError(message)
+        request.partial()
+        admission_section = ResultTextSection("Capture not attempted", parent=request.result)
+        admission_section.add_line(message)
+        return False
+
+    def _capture(self, request: ServiceRequest, start_time, timer, proxy, headers, user_agent, viewport):
+        # Enqueue the URL for processing
+        uuid = self.lookyloo.submit(
+            quiet=True,
+            url=request.task.fileinfo.uri_info.uri,
+            user_agent=user_agent,
+            proxy=proxy,
+            headers=headers,
+            viewport=viewport,
+        )
+        self.log.info(f"Enqueued URL {request.task.fileinfo.uri_info.uri} with UUID {uuid}")
+        timer.lap("capture submit")
+        uuid = self._wait_for_capture(request, start_time, timer, uuid)
+        if self.capture_admission and "capture ongoing" in timer.phases:
+            self.capture_admission.observe(timer.phases["capture ongoing"])
+        return uuid
+
+    def _wait_for_capture(self, request: ServiceRequest, start_time, timer, uuid):
+        def log_status_change(previous, status):
+            # Time spent waiting in the queue is told apart from the time spent by the browser capturing the URL
+            if previous is not None:
+                timer.lap(CAPTURE_PHASES.get(previous, "capture pending"))
+            if status == CAPTURE_STATUS_ONGOING:
+                self.log.info(f"URL {request.task.fileinfo.uri_info.uri} with UUID {uuid} is ongoing")
+                # Lacus records when it started the capture, the status is only seen at the next poll
+                if self.lacus_redis:
+                    try:
+                        started = self.lacus_redis.zscore(LACUS_QUEUE_KEYS[1], uuid)
+                    except Exception:
+                        started = None
+                    if started is not None:
+                        timer.mark("capture ongoing", started)
+
+        # Wait for the capture to complete, keeping some of the service timeout to process the capture
+        remaining_time = self._capture_time_left(start_time)
+        status = self.capture_waiter.wait(uuid, remaining_time, on_status_change=log_status_change)
+        if status in [CAPTURE_STATUS_QUEUED, CAPTURE_STATUS_ONGOING]:
+            timer.lap(CAPTURE_PHASES[status])
+            self.log.warning(f"Capture {uuid} timed out: {timer}")
+            raise Exception("Capture did not complete before the service timeout.")
+        if status != CAPTURE_STATUS_DONE:
+            raise Exception("Capture is not ready, an error occured.")
+
+        self.log.info(
+            f"Capture completed for UUID {uuid} after {timer.phases.get('capture queued', 0):.2f}s in the queue"
+        )
+        return uuid
 
     def execute(self, request: ServiceRequest) -> None:
+        start_time = time.monotonic()
+        timer = PhaseTimer()
         request.result = Result()  # Technically not needed, because result is pre-initialized in ServiceBase
 
         # Get the request data
@@ -192,21 +453,26 @@ class Lookyloo(ServiceBase):
             data = yaml.safe_load(f)
 
         data.pop("uri")
-        for no_dl in self.do_not_download_regexes:
+        if self.do_not_download.match(request.task.fileinfo.uri_info.uri):
             # Do nothing if we are not supposed to scan that URL
-            if no_dl.match(request.task.fileinfo.uri_info.uri):
-                return
+            return
 
         method = data.pop("method", "GET")
+        # Everything the task writes to its working directory counts against its budget
+        disk_budget = DiskBudget(self.config.get("task_disk_budget", 1024 * 1024 * 1024))
 
         if method != "GET":
             # Non-GET request
-            requests_content_path = self.send_http_request(method, request, data)
+            requests_content_path, content_info = self.send_http_request(method, request, data, disk_budget)
+            timer.lap("http request")
 
             if not requests_content_path:
+                self._report_timing(request, timer)
                 return
 
-            file_info = self.identify.fileinfo(requests_content_path, skip_fuzzy_hashes=True, calculate_entropy=False)
+            # The content was hashed as it was downloaded, only its type is left to identify
+            file_info = {**self._identify_type(requests_content_path), **content_info}
+            timer.lap("identify")
             if file_info["type"].startswith("archive"):
                 request.add_extracted(
                     requests_content_path,
@@ -221,6 +487,7 @@ class Lookyloo(ServiceBase):
                     "Full content from the URI",
                     parent_relation=PARENT_RELATION.DOWNLOADED,
                 )
+            self._report_timing(request, timer)
             return
 
         if proxy := self.config["proxies"].get(request.get_param("proxy")):
@@ -248,17 +515,6 @@ class Lookyloo(ServiceBase):
             for k, v in browser_settings.items():
                 ignored_params_section.set_item(f"browser_settings.{k}", v)
 
-        # Enqueue the URL for processing
-        uuid = self.lookyloo.submit(
-            quiet=True,
-            url=request.task.fileinfo.uri_info.uri,
-            user_agent=user_agent,
-            proxy=proxy,
-            headers=headers,
-            viewport=viewport,
-        )
-        self.log.info(f"Enqueued URL {request.task.fileinfo.uri_info.uri} with UUID {uuid}")
-
         sandbox_details = {
             "analysis_metadata": {},
             "sandbox_name": "Lookyloo",
@@ -269,23 +525,50 @@ class Lookyloo(ServiceBase):
         http_result = {}
         target_urls = {request.task.fileinfo.uri_info.uri}
 
-        # Wait for the capture to complete
-        while self.lookyloo.get_status(uuid)["status_code"] == 0:  # 0: The capture is queued up but not processed yet
-            sleep(1)
-
-        self.log.info(f"URL {request.task.fileinfo.uri_info.uri} with UUID {uuid} is ongoing")
-        while self.lookyloo.get_status(uuid)["status_code"] == 2:  # 2: The capture is ongoing and will be ready soon
-            sleep(1)
-
-        if self.lookyloo.get_status(uuid)["status_code"] != 1:
-            raise Exception("Capture is not ready, an error occured.")
-
-        self.log.info(f"Capture completed for UUID {uuid}")
-        # Retrieve the capture stats
-        stats = self.lookyloo.get_capture_stats(uuid)
+        # Reuse a recent capture done with the same settings if there is one
+        cache_key = None
+        uuid = None
+        timer.lap("prepare")
+        if self.capture_cache and request.get_param("use_capture_cache"):
+            cache_key = capture_cache_key(request.task.fileinfo.uri_info.uri, proxy, user_agent, headers, viewport)
+            if uuid := self.capture_cache.get(cache_key):
+                status = self.lookyloo.get_status(uuid)["status_code"]
+                timer.lap("capture cache")
+                if status in [CAPTURE_STATUS_QUEUED, CAPTURE_STATUS_ONGOING]:
+                    # The capture was prefetched and is still in progress
+                    uuid = self._wait_for_capture(request, start_time, timer, uuid)
+                elif status != CAPTURE_STATUS_DONE:
+                    # The capture is not available in Lookyloo anymore
+                    self.capture_cache.pop(cache_key)
+                    uuid = None
+
+        served_from_cache = uuid is not None
+        if served_from_cache:
+            self.log.info(f"Reusing capture {uuid} for URL {request.task.fileinfo.uri_info.uri}")
+        else:
+            if not self._admit_capture(request, start_time, timer):
+                self._report_timing(request, timer)
+                return
+            uuid = self._capture(request, start_time, timer, proxy, headers, user_agent, viewport)
+            if cache_key:
+                self.capture_cache.set(cache_key, uuid)
+
+        # Retrieve everything about the capture at once
+        fetched = self.capture_fetcher.fetch(uuid)
+        timer.lap("capture fetch")
+        self.log.info(
+            f"Fetched capture {uuid} ("
+            + ", ".join(f"{name}: {elapsed:.3f}s" for name, elapsed in fetched.timings.items())
+            + ")"
+        )
+        stats = fetched.stats
+        # Only the files becoming artifacts are written to disk, the others are read from memory directly
+        capture = fetched.files
 
         result_section = ResultKeyValueSection("Result", parent=request.result)
         result_section.set_item("Lookyloo UUID", uuid)
+        if served_from_cache:
+            result_section.set_item("Served from cache", True)
 
         # Add the stats to the result section
         for key, value in stats.items():
@@ -295,53 +578,56 @@ class Lookyloo(ServiceBase):
         if stats.get("total_cookies_received", 0) > 0:
             # Populate cookies if available
             cookies_top_section = ResultSection("Cookies", auto_collapse=True, parent=request.result)
-            cookies = self.lookyloo.get_cookies(uuid)
-            for cookie in cookies:
+            for cookie in fetched.cookies:
                 cookies_section = ResultKeyValueSection(f"Cookie: {cookie['name']}", parent=cookies_top_section)
                 for key, value in cookie.items():
                     cookies_section.set_item(key, value)
 
-        capture = self.lookyloo.get_complete_capture(uuid)
-        with zipfile.ZipFile(capture, "r") as zipped_file:
-            zipped_file.extractall(path=os.path.join(self.working_directory, "lookyloo_output"))
-
-        possible_outputs = os.listdir(os.path.join(self.working_directory, "lookyloo_output"))
-        assert len(possible_outputs) == 1
-        output_folder = os.path.join(self.working_directory, "lookyloo_output", possible_outputs[0])
-
-        screenshot_path = os.path.join(output_folder, "0.png")
-        if os.path.exists(screenshot_path):
+        if "0.png" in capture:
+            # Oversized screenshots are downsampled before the image section re-encodes them and builds the thumbnail
+            screenshot = process_screenshot(
+                capture.read("0.png"),
+                os.path.join(self.working_directory, "0.png"),
+                self.config.get("screenshot_max_dimension", 8192),
+                self.config.get("screenshot_max_size", 5 * 1024 * 1024),
+            )
+            disk_budget.spend(screenshot.size)
+            description = f"Screenshot of final page visited: {request.task.fileinfo.uri_info.uri}"
+            if screenshot.original_dimensions:
+                description += " (downsampled from {}x{})".format(*screenshot.original_dimensions)
             screenshot_section = ResultImageSection(
                 request, title_text="Screenshot of visited page", parent=request.result
             )
-            screenshot_section.add_image(
-                path=screenshot_path,
-                name="screenshot.png",
-                description=f"Screenshot of final page visited: {request.task.fileinfo.uri_info.uri}",
-            )
+            screenshot_section.add_image(path=screenshot.path, name="screenshot.png", description=description)
             screenshot_section.promote_as_screenshot()
-
-        favicon_path = os.path.join(output_folder, "0.potential_favicon.ico")
-        if os.path.exists(favicon_path):
+            if screenshot.dhash:
+                result_section.set_item("Screenshot dHash", screenshot.dhash)
+
+        if "0.potential_favicon.ico" in capture:
+            favicon_path = os.path.join(self.working_directory, "0.potential_favicon.ico")
+            favicon = capture.read("0.potential_favicon.ico")
+            with open(favicon_path, "wb") as f:
+                f.write(favicon)
+            disk_budget.spend(len(favicon))
             favicon_section = ResultImageSection(request, title_text="Favicon of visited page", parent=request.result)
             favicon_section.add_image(
                 path=favicon_path,
                 name="favicon.ico",
                 description=f"Favicon of {request.task.fileinfo.uri_info.uri}",
             )
-            fileinfo = self.identify.fileinfo(favicon_path, skip_fuzzy_hashes=True, calculate_entropy=False)
-            http_result["favicon"] = {
-                "md5": fileinfo["md5"],
-                "sha1": fileinfo["sha1"],
-                "sha256": fileinfo["sha256"],
-                "size": fileinfo["size"],
-            }
-
-        if redirects := self.lookyloo.get_redirects(uuid):
+            fileinfo = favicon_info(favicon)
+            if "dhash" in fileinfo:
+                result_section.set_item("Favicon dHash", fileinfo.pop("dhash"))
+            http_result["favicon"] = fileinfo
+
+        # The rendered page is the one at the end of the redirections
+        rendered_url = request.task.fileinfo.uri_info.uri
+        if redirects := fetched.redirects:
             # Since the page can refresh itself, there can be redirect false positives with the same URL
             if redirects["response"]["url"] in redirects["response"]["redirects"]:
                 redirects["response"]["redirects"].remove(redirects["response"]["url"])
             if redirects["response"]["redirects"]:
+                rendered_url = redirects["response"]["redirects"][-1]
                 http_result["redirects"] = []
                 redirect_section = ResultKeyValueSection("Redirections", parent=request.result)
                 redirect_section.set_item(redirects["response"]["url"], ", ".join(redirects["response"]["redirects"]))
@@ -354,202 +640,281 @@ class Lookyloo(ServiceBase):
                     {"from_url": redirects["response"]["url"], "to_url": ", ".join(redirects["response"]["redirects"])}
                 )
 
-        source_path = os.path.join(output_folder, "0.html")
-        if os.path.exists(source_path):
-            with open(source_path, "rb") as f:
-                data = f.read()
-            soup = BeautifulSoup(data, features="lxml")
-            if soup.title and soup.title.string:
-                http_result["title"] = soup.title.string
+        if "0.html" in capture:
+            # Only the title and the links are needed, the scan stops early on pages that are not listings
+            # Lookyloo writes the rendered page in UTF-8, whatever the encoding it was served with
+            page = scan_html(capture.read("0.html"), encoding="utf-8")
+            if page.title:
+                http_result["title"] = page.title
 
             try:
-                detect_open_directory(request, soup)
+                listed_urls = detect_open_directory(request, page)
             except Exception:
-                pass
+                listed_urls = []
+
+            # Excluded URLs are not captured ahead of time either, nor is anything when the submission opted out
+            listed_urls = [listed_url for listed_url in listed_urls if not self.do_not_download.match(listed_url)]
+            if self.capture_prefetcher and listed_urls and request.get_param("use_capture_cache"):
+                # Capture the listed files while this task is processed, they are likely to be submitted next
+                if prefetched := self.capture_prefetcher.prefetch(listed_urls, proxy, user_agent, headers, viewport):
+                    self.log.info(f"Prefetching captures for {len(prefetched)} listed URLs")
 
         # Possible duplicate of cookie section
-        storage_path = os.path.join(output_folder, "0.storage.json")
-        if os.path.exists(storage_path):
+        if "0.storage.json" in capture:
             # Populate cookies if available
-            with open(storage_path, "rb") as f:
-                storage = json.load(f)
+            storage = json.loads(capture.read("0.storage.json"))
             if storage.get("cookies"):
                 cookies_section = ResultTableSection("Cookies", auto_collapse=True, parent=request.result)
                 for cookie in storage.get("cookies"):
                     cookies_section.add_row(TableRow(**cookie))
 
-        # Find any downloaded file
-        with gzip.open(os.path.join(output_folder, "0.har.gz"), "rb") as f:
-            har_content = json.load(f)
-
-        for entry in har_content["log"]["pages"]:
-            if entry["startedDateTime"]:
-                sandbox_details["analysis_metadata"]["start_time"] = entry["startedDateTime"]
-                break
+        timer.lap("page analysis")
 
+        # Find any downloaded file, streaming the session log one entry at a time
         downloads = {}
-        redirects = []
+        redirect_graph = RedirectGraph(target_urls)
         response_errors = []
-        for entry in har_content["log"]["entries"]:
-            if "response_code" not in http_result:
-                http_result["response_code"] = entry["response"]["status"]
-
-            # Convert list of header to a proper dictionary
-            request_headers = {header["name"]: header["value"] for header in entry["request"]["headers"]}
-            response_headers = {header["name"]: header["value"] for header in entry["response"]["headers"]}
-
-            http_details = {
-                "request_uri": entry["request"]["url"],
-                # ElasticSearch mappings does not support mapping key starting with :
-                # We need to skip Pseudo-Header Fields defined in HTTP/2
-                "request_headers": {k: v for k, v in request_headers.items() if not k.startswith(":")},
-                "request_method": entry["request"]["method"],
-                "response_headers": {k: v for k, v in response_headers.items() if not k.startswith(":")},
-                "response_status_code": entry["response"]["status"],
-            }
-
-            # Figure out if there is an http redirect
-            if entry["response"]["status"] in [301, 302, 303, 307, 308]:
-                redirecting_to = ""
-                if "redirectURL" in entry["response"]:
-                    redirecting_to = entry["response"]["redirectURL"]
-                if redirecting_to == "" and "Location" in response_headers:
-                    redirecting_to = response_headers["Location"]
-                if redirecting_to == "" and "Refresh" in response_headers:
-                    if refresh := parse_refresh_header(response_headers["Refresh"]):
-                        redirecting_to = refresh
-                if redirecting_to == "" and "refresh" in response_headers:
-                    if refresh := parse_refresh_header(response_headers["refresh"]):
-                        redirecting_to = refresh
-                redirects.append(
-                    {
-                        "status": entry["response"]["status"],
-                        "redirecting_url": entry["request"]["url"],
-                        "redirecting_ip": (entry["serverIPAddress"] if "serverIPAddress" in entry else "Not Available"),
-                        "redirecting_to": redirecting_to if redirecting_to else "Not Available",
-                    }
-                )
+        deduplicated_files = 0
+        deduplicated_bytes = 0
+        documents = []
+        connections = ConnectionCollector(
+            self.config.get("ontology_mode", "full"), self.config.get("ontology_max_connections", 0)
+        )
+        document_max_size = self.config.get("document_max_size", 5 * 1024 * 1024)
+        dropped_content = {}
+        dropped_rows = []
+        # The rewritten log is compressed as it is written, rather than once complete
+        har_compression = self.config.get("har_compression", "none")
+        modified_har_filepath = os.path.join(self.working_directory, "modified_session.har")
+        har_index_filepath = os.path.join(self.working_directory, "session_index.jsonl")
+        with (
+            capture,
+            gzip.open(capture.open("0.har.gz"), "rb") as har_file,
+            open_har_output(
+                modified_har_filepath, har_compression, self.config.get("har_compression_level", 6)
+            ) as modified_har_file,
+            open(har_index_filepath, "w") if self.config.get("har_index", False) else nullcontext() as har_index_file,
+        ):
+            har = HarRewriter(har_file, ChargedWriter(modified_har_file, disk_budget))
+            har_index = ChargedWriter(har_index_file, disk_budget) if har_index_file else None
+            for entry in har.entries():
+                if "response_code" not in http_result:
+                    http_result["response_code"] = entry["response"]["status"]
+
+                http_details = {
+                    "request_uri": entry["request"]["url"],
+                    # ElasticSearch mappings does not support mapping key starting with :
+                    # We need to skip Pseudo-Header Fields defined in HTTP/2
+                    "request_headers": {
+                        header["name"]: header["value"]
+                        for header in entry["request"]["headers"]
+                        if not header["name"].startswith(":")
+                    },
+                    "request_method": entry["request"]["method"],
+                    "response_headers": {
+                        header["name"]: header["value"]
+                        for header in entry["response"]["headers"]
+                        if not header["name"].startswith(":")
+                    },
+                    "response_status_code": entry["response"]["status"],
+                }
 
-            # Some redirects and hidden in the headers with 200 response codes
-            if "refresh" in response_headers:
-                if refresh := parse_refresh_header(response_headers["refresh"]):
-                    redirects.append(
-                        {
-                            "status": entry["response"]["status"],
-                            "redirecting_url": entry["request"]["url"],
-                            "redirecting_ip": (
-                                entry["serverIPAddress"] if "serverIPAddress" in entry else "Not Available"
-                            ),
-                            "redirecting_to": refresh,
+                # Figure out if there is an http redirect
+                redirect_graph.add_entry(entry)
+
+                # Find all content that was downloaded from the servers
+                if "size" in entry["response"]["content"] and entry["response"]["content"]["size"] > 0:
+                    content_text = entry["response"]["content"].pop("text")
+                    content_encoding = entry["response"]["content"].get("encoding")
+                    # The body is decoded once, and only written if no identical content was already
+                    content = io.BytesIO()
+                    fileinfo = decode_content(content_text, content_encoding, content)
+                    content_md5 = fileinfo["md5"]
+                    if content_md5 in downloads:
+                        deduplicated_files += 1
+                        deduplicated_bytes += fileinfo["size"]
+                    elif content_md5 in dropped_content:
+                        pass
+                    elif not disk_budget.fits(fileinfo["size"]):
+                        # Still hashed, so the session log and the ontology tell what the content was
+                        dropped_content[content_md5] = fileinfo
+                        dropped_rows.append(
+                            TableRow(url=entry["request"]["url"], size=fileinfo["size"], sha256=fileinfo["sha256"])
+                        )
+                    else:
+                        with tempfile.NamedTemporaryFile(
+                            dir=self.working_directory, delete=False, mode="wb"
+                        ) as content_file:
+                            content_file.write(content.getbuffer())
+                        disk_budget.spend(fileinfo["size"])
+
+                        # The type is identified in the pool, and merged in the fileinfo once the session is processed
+                        downloads[content_md5] = {
+                            "path": content_file.name,
+                            "identify": self.identify_pool.submit(self._identify_type, content_file.name),
                         }
+
+                        # Every distinct document is analysed once, the rendered page was already through 0.html
+                        mime_type = entry["response"]["content"].get("mimeType") or ""
+                        is_html = mime_type.startswith(HTML_MIME_TYPES)
+                        if (
+                            (is_html or mime_type.startswith(XML_MIME_TYPES))
+                            and fileinfo["size"] <= document_max_size
+                            and not (is_html and entry["request"]["url"] == rendered_url)
+                        ):
+                            scan = find_webdav_links
+                            if is_html:
+                                # Bodies the log holds as text were written in UTF-8, the others as they were served
+                                charset = "utf-8"
+                                if content_encoding == "base64":
+                                    content_type = find_header(entry["response"]["headers"], "Content-Type")
+                                    charset = content_charset(content_type or mime_type)
+                                scan = partial(scan_html, encoding=charset)
+                            documents.append(
+                                (
+                                    entry["request"]["url"],
+                                    self.document_pool.submit(self._analyse_document, scan, content_file.name),
+                                )
+                            )
+
+                    entry["response"]["content"]["_replaced"] = fileinfo["sha256"]
+                    http_details["response_content_fileinfo"] = {
+                        "md5": fileinfo["md5"],
+                        "sha1": fileinfo["sha1"],
+                        "sha256": fileinfo["sha256"],
+                        "size": fileinfo["size"],
+                    }
+                    if "mimeType" in entry["response"]["content"] and entry["response"]["content"]["mimeType"]:
+                        http_details["response_content_mimetype"] = entry["response"]["content"]["mimeType"]
+
+                    # Content dropped over the disk budget was not written, so there is nothing to name
+                    if content_md5 not in dropped_content:
+                        # The headers could contain the name of the downloaded file
+                        # Some servers are returning an empty "Content-Disposition"
+                        if content_disposition := find_header(entry["response"]["headers"], "Content-Disposition"):
+                            downloads[content_md5]["filename"] = content_disposition
+                            match = ASCII_FILENAME_REGEX.search(downloads[content_md5]["filename"])
+                            if match:
+                                downloads[content_md5]["filename"] = match.group(2)
+
+                            match = UTF8_FILENAME_REGEX.search(downloads[content_md5]["filename"])
+                            if match:
+                                downloads[content_md5]["filename"] = match.group(1)
+                        else:
+                            filename = None
+                            requested_url = urlparse(entry["request"]["url"])
+                            if "." in os.path.basename(requested_url.path):
+                                filename = os.path.basename(requested_url.path)
+
+                            if not filename:
+                                possible_filename = entry["request"]["url"]
+                                if len(possible_filename) > 150:
+                                    parsed_url = requested_url._replace(fragment="")
+                                    possible_filename = parsed_url.geturl()
+
+                                if len(possible_filename) > 150:
+                                    parsed_url = parsed_url._replace(params="")
+                                    possible_filename = parsed_url.geturl()
+
+                                if len(possible_filename) > 150:
+                                    parsed_url = parsed_url._replace(query="")
+                                    possible_filename = parsed_url.geturl()
+
+                                if len(possible_filename) > 150:
+                                    parsed_url = parsed_url._replace(path="")
+                                    possible_filename = parsed_url.geturl()
+                                filename = possible_filename
+
+                            downloads[content_md5]["filename"] = filename
+
+                        if not downloads[content_md5]["filename"]:
+                            downloads[content_md5]["filename"] = f"UnknownFilename_{fileinfo['sha256'][:8]}"
+                        downloads[content_md5]["size"] = entry["response"]["content"]["size"]
+                        downloads[content_md5]["url"] = entry["request"]["url"]
+                        downloads[content_md5]["mimeType"] = entry["response"]["content"]["mimeType"]
+                        downloads[content_md5]["fileinfo"] = fileinfo
+
+                if "_errorMessage" in entry["response"]:
+                    response_errors.append((entry["request"]["url"], entry["response"]["_errorMessage"]))
+
+                connections.add(http_details)
+
+                if har_index:
+                    content_fileinfo = http_details.get("response_content_fileinfo", {})
+                    har_index.write(
+                        json.dumps(
+                            {
+                                "url": entry["request"]["url"],
+                                "status": entry["response"]["status"],
+                                "sha256": content_fileinfo.get("sha256"),
+                                "size": content_fileinfo.get("size"),
+                            }
+                        )
+                        + "\n"
                     )
 
-            # Find all content that was downloaded from the servers
-            if "size" in entry["response"]["content"] and entry["response"]["content"]["size"] > 0:
-                content_text = entry["response"]["content"].pop("text")
-                if "encoding" in entry["response"]["content"] and entry["response"]["content"]["encoding"] == "base64":
-                    try:
-                        content = base64.b64decode(content_text)
-                    except Exception:
-                        content = content_text.encode()
-                else:
-                    content = content_text.encode()
-
-                with tempfile.NamedTemporaryFile(dir=self.working_directory, delete=False, mode="wb") as content_file:
-                    content_file.write(content)
-
-                fileinfo = self.identify.fileinfo(content_file.name, skip_fuzzy_hashes=True, calculate_entropy=False)
-                content_md5 = fileinfo["md5"]
-                entry["response"]["content"]["_replaced"] = fileinfo["sha256"]
-                http_details["response_content_fileinfo"] = {
-                    "md5": fileinfo["md5"],
-                    "sha1": fileinfo["sha1"],
-                    "sha256": fileinfo["sha256"],
-                    "size": fileinfo["size"],
-                }
-                if "mimeType" in entry["response"]["content"] and entry["response"]["content"]["mimeType"]:
-                    http_details["response_content_mimetype"] = entry["response"]["content"]["mimeType"]
-
-                if content_md5 not in downloads:
-                    downloads[content_md5] = {"path": content_file.name}
-
-                # The headers could contain the name of the downloaded file
-                if (
-                    "Content-Disposition" in response_headers
-                    # Some servers are returning an empty "Content-Disposition"
-                    and response_headers["Content-Disposition"]
-                ):
-                    downloads[content_md5]["filename"] = response_headers["Content-Disposition"]
-                    match = re.search(ASCII_FILENAME_REGEX, downloads[content_md5]["filename"])
-                    if match:
-                        downloads[content_md5]["filename"] = match.group(2)
-
-                    match = re.search(UTF8_FILENAME_REGEX, downloads[content_md5]["filename"])
-                    if match:
-                        downloads[content_md5]["filename"] = match.group(1)
-                else:
-                    filename = None
-                    requested_url = urlparse(entry["request"]["url"])
-                    if "." in os.path.basename(requested_url.path):
-                        filename = os.path.basename(requested_url.path)
-
-                    if not filename:
-                        possible_filename = entry["request"]["url"]
-                        if len(possible_filename) > 150:
-                            parsed_url = requested_url._replace(fragment="")
-                            possible_filename = parsed_url.geturl()
-
-                        if len(possible_filename) > 150:
-                            parsed_url = parsed_url._replace(params="")
-                            possible_filename = parsed_url.geturl()
-
-                        if len(possible_filename) > 150:
-                            parsed_url = parsed_url._replace(query="")
-                            possible_filename = parsed_url.geturl()
-
-                        if len(possible_filename) > 150:
-                            parsed_url = parsed_url._replace(path="")
-                            possible_filename = parsed_url.geturl()
-                        filename = possible_filename
-
-                    downloads[content_md5]["filename"] = filename
-
-                if not downloads[content_md5]["filename"]:
-                    downloads[content_md5]["filename"] = f"UnknownFilename_{fileinfo['sha256'][:8]}"
-                downloads[content_md5]["size"] = entry["response"]["content"]["size"]
-                downloads[content_md5]["url"] = entry["request"]["url"]
-                downloads[content_md5]["mimeType"] = entry["response"]["content"]["mimeType"]
-                downloads[content_md5]["fileinfo"] = fileinfo
-
-                if entry["response"]["status"] == 207 and downloads[content_md5]["mimeType"].startswith("text/xml"):
-                    detect_webdav_listing(request, content)
-
-            if "_errorMessage" in entry["response"]:
-                response_errors.append((entry["request"]["url"], entry["response"]["_errorMessage"]))
-
-            self.ontology.add_result_part(
-                model=NetworkConnection, data={"http_details": http_details, "connection_type": "http"}
-            )
+        timer.lap("session log")
 
-        # Add the modified entries log
-        modified_har_filepath = os.path.join(self.working_directory, "modified_session.har")
-        with open(modified_har_filepath, "w") as f:
-            json.dump(har_content, f)
+        # Gather the type of every downloaded file, in the order they were found
+        for download_params in downloads.values():
+            try:
+                identified = download_params.pop("identify").result()
+            except Exception as e:
+                self.log.warning(f"Could not identify the content from {download_params['url']}: {e}")
+                continue
+            # The digests of the decoded body are kept over whatever identify reports
+            download_params["fileinfo"] = {**identified, **download_params["fileinfo"]}
+        timer.lap("identify")
+
+        # Look for listings in all the documents, in the order they were found
+        document_titles = ResultTableSection("Document Titles", auto_collapse=True)
+        for document_url, document in documents:
+            try:
+                analysis = document.result()
+            except Exception as e:
+                self.log.warning(f"Could not analyse the document from {document_url}: {e}")
+                continue
+
+            if isinstance(analysis, ScannedPage):
+                if analysis.title:
+                    document_titles.add_row(TableRow({"url": document_url, "title": analysis.title}))
+                detect_open_directory(request, analysis, document_url)
+            else:
+                detect_webdav_listing(request, analysis, document_url)
+        if document_titles.body:
+            request.result.add_section(document_titles)
+        timer.lap("documents")
+
+        for entry in har.log.get("pages", []):
+            if entry["startedDateTime"]:
+                sandbox_details["analysis_metadata"]["start_time"] = entry["startedDateTime"]
+                if "capture ongoing" in timer.marks:
+                    # The page is only opened once the browser is launched and its context created, only known
+                    # when Lacus recorded when the capture started
+                    page_started = datetime.fromisoformat(entry["startedDateTime"])
+                    timer.details["browser launch"] = max(
+                        0.0, page_started.timestamp() - timer.marks["capture ongoing"]
+                    )
+                break
 
-        request.add_supplementary(modified_har_filepath, "session.har", "Complete session log")
+        # Add the modified entries log
+        if har_compression == "gzip":
+            request.add_supplementary(
+                f"{modified_har_filepath}.gz", "session.har.gz", "Complete session log (gzip compressed)"
+            )
+        else:
+            request.add_supplementary(modified_har_filepath, "session.har", "Complete session log")
+        if har_index_file:
+            request.add_supplementary(
+                har_index_filepath, "session_index.jsonl", "URL, status, SHA256 and size of every session log entry"
+            )
 
-        if redirects:
+        # The downloads on the way from the submitted URL are the ones extracted
+        target_urls = redirect_graph.chain_urls()
+        if redirect_graph.redirects:
             http_result["redirects"] = []
             redirect_section = ResultMultiSection("Redirections", parent=request.result)
-            main_redirection = TableSectionBody()
-            secondary_redirection = TableSectionBody()
-            for redirect in redirects:
-                if redirect["redirecting_url"] in target_urls:
-                    target_urls.add(redirect["redirecting_to"])
-                    table_body = main_redirection
-                else:
-                    table_body = secondary_redirection
-                table_body.add_row(TableRow(redirect))
+            for redirect in redirect_graph.redirects:
                 add_tag(redirect_section, "network.static.uri", redirect["redirecting_url"])
                 if redirect["redirecting_ip"] != "Not Available":
                     redirect_section.add_tag("network.static.ip", redirect["redirecting_ip"])
@@ -558,11 +923,31 @@ class Lookyloo(ServiceBase):
                 http_result["redirects"].append(
                     {"from_url": redirect["redirecting_url"], "to_url": redirect["redirecting_to"]}
                 )
-            for table_body in [main_redirection, secondary_redirection]:
-                if table_body.body:
+            for table_redirects in redirect_graph.split(target_urls):
+                if table_redirects:
+                    table_body = TableSectionBody()
+                    for redirect in table_redirects:
+                        table_body.add_row(TableRow(redirect))
                     table_body.set_column_order(["status", "redirecting_url", "redirecting_ip", "redirecting_to"])
                     redirect_section.add_section_part(table_body)
 
+        # The connections are only emitted once the chain is known, so those on it keep their detail
+        connection_parts = connections.parts(target_urls)
+        for connection_part in connection_parts:
+            self.ontology.add_result_part(model=NetworkConnection, data=connection_part)
+        if connections.deduplicated or connections.summarized or connections.overflow:
+            connections_section = ResultKeyValueSection(
+                "Network Connections", auto_collapse=True, parent=request.result
+            )
+            connections_section.set_item("Emitted", len(connection_parts))
+            connections_section.set_item("Deduplicated", connections.deduplicated)
+            connections_section.set_item("Summarized", connections.summarized)
+            connections_section.set_item("Not emitted over the limit", connections.overflow)
+            self.log.info(
+                f"Network connections: {len(connection_parts)} emitted, {connections.deduplicated} deduplicated, "
+                f"{connections.summarized} summarized, {connections.overflow} over the limit"
+            )
+
         self.ontology.add_result_part(model=Sandbox, data=sandbox_details)
         self.ontology.add_result_part(model=HTTPResult, data=http_result)
 
@@ -578,7 +963,7 @@ class Lookyloo(ServiceBase):
                         download_params["path"],
                         download_params["filename"],
                         download_params["url"] or "Unknown URL",
-                        safelist_interface=self.api_interface,
+                        safelist_interface=self.safelist,
                         parent_relation=PARENT_RELATION.DOWNLOADED,
                     )
                 else:
@@ -606,7 +991,28 @@ class Lookyloo(ServiceBase):
             if safelisted_section.body:
                 request.result.add_section(safelisted_section)
 
+        if deduplicated_files:
+            self.log.info(f"Deduplicated {deduplicated_files} responses ({deduplicated_bytes} bytes)")
+            deduplication_section = ResultKeyValueSection(
+                "Deduplicated Content", auto_collapse=True, parent=request.result
+            )
+            deduplication_section.set_item("Duplicate responses", deduplicated_files)
+            deduplication_section.set_item("Duplicate bytes", deduplicated_bytes)
+
+        if dropped_rows:
+            # What is missing from the result could be found by another analysis of the URL
+            request.partial()
+            self.log.info(f"Dropped {len(dropped_rows)} responses over the disk budget of {disk_budget.max_bytes}B")
+            dropped_section = ResultTableSection(
+                f"Dropped Content (over the disk budget of {disk_budget.max_bytes} bytes)", parent=request.result
+            )
+            for row in dropped_rows:
+                dropped_section.add_row(row)
+
         if response_errors:
             error_section = ResultTextSection("Responses Error", parent=request.result)
             for response_url, response_error in response_errors:
                 error_section.add_line(f"{response_url}: {response_error}")
+
+        timer.lap("results")
+        self._report_timing(request, timer)
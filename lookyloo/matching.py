@@ -0,0 +1,130 @@
+import re
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parser
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse as sre_parser
+
+# Above this many literal prefixes, a pattern is not worth indexing
+MAX_PREFIXES = 16
+# Characters ending the scheme and host part of a URL
+HOST_TERMINATORS = "/?#:@"
+# Back references change meaning once patterns are combined, as the groups get renumbered
+GROUP_REFERENCE_REGEX = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+
+def _sequence_alternatives(parsed) -> list[str] | None:
+    # Every literal string a sequence of opcodes can match, None if it can match anything else
+    results = [""]
+    for op, av in parsed:
+        alternatives = _alternatives(op, av)
+        if alternatives is None:
+            return None
+        results = [result + alternative for result in results for alternative in alternatives]
+        if len(results) > MAX_PREFIXES:
+            return None
+    return results
+
+
+def _alternatives(op, av) -> list[str] | None:
+    if op is sre_constants.LITERAL:
+        return [chr(av)]
+    if op is sre_constants.IN and all(item_op is sre_constants.LITERAL for item_op, _ in av):
+        return [chr(item_av) for _, item_av in av]
+    if op is sre_constants.SUBPATTERN:
+        _, add_flags, del_flags, subpattern = av
+        return None if add_flags or del_flags else _sequence_alternatives(subpattern)
+    if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[:2] == (0, 1):
+        alternatives = _sequence_alternatives(av[2])
+        return None if alternatives is None else ["", *alternatives]
+    if op is sre_constants.BRANCH:
+        results = []
+        for branch in av[1]:
+            alternatives = _sequence_alternatives(branch)
+            if alternatives is None:
+                return None
+            results.extend(alternatives)
+        return results
+    return None
+
+
+def literal_prefixes(pattern: str) -> list[str] | None:
+    """List the literal strings every match of ``pattern`` starts with one of.
+
+    Returns:
+        The prefixes, which can be empty strings, or None if there are too many of them.
+    """
+    prefixes = [""]
+    for op, av in sre_parser.parse(pattern):
+        if op is sre_constants.AT and av is sre_constants.AT_BEGINNING and prefixes == [""]:
+            continue
+        alternatives = _alternatives(op, av)
+        if alternatives is None:
+            break
+        prefixes = [prefix + alternative for prefix in prefixes for alternative in alternatives]
+        if len(prefixes) > MAX_PREFIXES:
+            return None
+    return prefixes
+
+
+def host_key(url: str, complete: bool = True) -> str | None:
+    """Cut a URL, or the start of one, after its scheme and host.
+
+    Args:
+        url: The URL to cut.
+        complete: Whether ``url`` is a whole URL, so it can end with its host.
+
+    Returns:
+        The scheme and host part, None if ``url`` is only the start of one and does not say where the host ends.
+    """
+    start = url.find("://")
+    if start < 0:
+        return None
+    for index in range(start + 3, len(url)):
+        if url[index] in HOST_TERMINATORS:
+            return url[:index]
+    return url if complete else None
+
+
+def _combine(patterns: list[str]) -> list[re.Pattern]:
+    try:
+        return [re.compile("|".join(f"(?:{pattern})" for pattern in patterns))]
+    except re.error:
+        # Usually the same group name in several patterns
+        return [re.compile(pattern) for pattern in patterns]
+
+
+class UrlMatcher:
+    """Match URLs against many regular expressions at once, as ``re.match`` would with each of them.
+
+    Patterns which can only match URLs of a few known hosts are indexed by scheme and host, so only those of the host
+    of a URL are tried. The others are combined into a single alternation. Patterns with flags or back references
+    are kept apart, as combining them would change their meaning.
+    """
+
+    def __init__(self, patterns: list[str]) -> None:
+        indexed: dict[str, list[str]] = {}
+        combined: list[str] = []
+        self._separate: list[re.Pattern] = []
+        for pattern in patterns:
+            compiled = re.compile(pattern)
+            if compiled.flags != re.UNICODE or GROUP_REFERENCE_REGEX.search(pattern):
+                self._separate.append(compiled)
+                continue
+
+            prefixes = literal_prefixes(pattern)
+            keys = {host_key(prefix, complete=False) for prefix in prefixes} if prefixes else {None}
+            if None in keys:
+                combined.append(pattern)
+            else:
+                for key in keys:
+                    indexed.setdefault(key, []).append(pattern)
+
+        self._index = {key: _combine(key_patterns) for key, key_patterns in indexed.items()}
+        self._combined = _combine(combined) if combined else []
+
+    def match(self, url: str) -> bool:
+        candidates = self._index.get(host_key(url), [])
+        return any(pattern.match(url) for pattern in [*candidates, *self._combined, *self._separate])
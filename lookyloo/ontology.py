@@ -0,0 +1,68 @@
+from typing import Any
+
+# "full" keeps every connection with its headers, "compact" deduplicates them and only keeps the headers of the
+# connections on the way from the submitted URL
+ONTOLOGY_MODES = ["full", "compact"]
+
+
+class ConnectionCollector:
+    """Collect the HTTP connections of a capture, and decide which go in the ontology and with how much detail.
+
+    The connections on the way from the submitted URL are kept in full, and emitted before the others when there is
+    room for only some of them. Past ``max_parts`` connections, the others are only counted.
+    """
+
+    def __init__(self, mode: str = "full", max_parts: int = 0) -> None:
+        if mode not in ONTOLOGY_MODES:
+            raise ValueError(f"Unknown ontology mode {mode}, it should be one of {', '.join(ONTOLOGY_MODES)}")
+        self.mode = mode
+        self.max_parts = max_parts
+        self.deduplicated = 0
+        self.summarized = 0
+        self.overflow = 0
+        self._details: list[dict[str, Any]] = []
+        self._seen: set[tuple] = set()
+
+    def add(self, http_details: dict[str, Any]) -> None:
+        if self.mode == "compact":
+            key = (
+                http_details["request_method"],
+                http_details["request_uri"],
+                http_details["response_status_code"],
+                http_details.get("response_content_fileinfo", {}).get("sha256"),
+            )
+            if key in self._seen:
+                self.deduplicated += 1
+                return
+            self._seen.add(key)
+        self._details.append(http_details)
+
+    def parts(self, chain_urls: set[str]) -> list[dict[str, Any]]:
+        """List the ontology parts of the connections kept, in the order they were added.
+
+        Returns:
+            The HTTP ontology part of every connection emitted.
+        """
+        on_chain = [http_details["request_uri"] in chain_urls for http_details in self._details]
+        chain_room = self.max_parts or len(self._details)
+        room = max(0, self.max_parts - sum(on_chain)) if self.max_parts else len(self._details)
+
+        parts = []
+        for http_details, chain in zip(self._details, on_chain):
+            if chain:
+                # Redirect loops and long refresh chains are capped too, keeping the start of the chain
+                if chain_room <= 0:
+                    self.overflow += 1
+                    continue
+                chain_room -= 1
+            else:
+                if room <= 0:
+                    self.overflow += 1
+                    continue
+                room -= 1
+                if self.mode == "compact":
+                    # Third-party resources keep what they are, not how they were requested
+                    http_details = {**http_details, "request_headers": {}, "response_headers": {}}
+                    self.summarized += 1
+            parts.append({"http_details": http_details, "connection_type": "http"})
+        return parts
@@ -0,0 +1,117 @@
+import codecs
+import xml.etree.ElementTree as ET
+
+from lxml import etree
+
+# Content types of the documents scanned for their title and links, and for WebDAV listings
+HTML_MIME_TYPES = ("text/html", "application/xhtml+xml")
+XML_MIME_TYPES = ("text/xml", "application/xml")
+
+# Bytes of the page given to the parser at once, the scan can stop between two of them
+HTML_CHUNK_SIZE = 64 * 1024
+
+
+class ScannedPage:
+    """What was found in a page: its title, and the links of its anchors."""
+
+    def __init__(self) -> None:
+        # The text of the first title element, None when it is empty
+        self.title: str | None = None
+        self.title_found = False
+        self.hrefs: list[str] = []
+        # False when the scan stopped before the end of the page
+        self.complete = False
+
+    @property
+    def is_directory_listing(self) -> bool:
+        return self.title is not None and "index of" in self.title.lower()
+
+
+def _read_events(parser: etree.HTMLPullParser, page: ScannedPage) -> bool:
+    # Returns True once the rest of the page is not needed anymore
+    for event, element in parser.read_events():
+        if event == "start":
+            if element.tag == "a" and element.get("href"):
+                page.hrefs.append(element.get("href"))
+            continue
+
+        if element.tag == "title" and not page.title_found:
+            page.title_found = True
+            page.title = element.text if len(element) == 0 else None
+            if not page.is_directory_listing:
+                return True
+        # Only the elements still being parsed are needed, this keeps the tree from growing with the page
+        element.clear()
+    return False
+
+
+def scan_html(data: bytes, chunk_size: int = HTML_CHUNK_SIZE, encoding: str | None = None) -> ScannedPage:
+    """Scan a page for its title and the links of its anchors, in a single pass.
+
+    The scan stops as soon as the title shows the page is not a directory listing, as the links are only needed for
+    listings.
+
+    Args:
+        data: The page.
+        chunk_size: Bytes of the page given to the parser at once.
+        encoding: Encoding of the page, when known. Otherwise the page has to declare it, or Latin-1 is assumed.
+
+    Returns:
+        The title and links found, and whether the whole page was scanned.
+    """
+    page = ScannedPage()
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    # The page is decoded by Python rather than libxml2, which does not know every name of the Python codecs
+    decode = None
+    if encoding:
+        try:
+            decode = codecs.getincrementaldecoder(encoding)(errors="replace").decode
+        except LookupError:
+            pass
+    try:
+        for offset in range(0, len(data), chunk_size):
+            chunk = data[offset : offset + chunk_size]
+            parser.feed(decode(chunk) if decode else chunk)
+            if _read_events(parser, page):
+                return page
+        if decode:
+            parser.feed(decode(b"", final=True))
+        parser.close()
+        _read_events(parser, page)
+    except etree.LxmlError:
+        # Keep what could be parsed from a page lxml gives up on
+        pass
+    page.complete = True
+    return page
+
+
+def content_charset(content_type: str | None) -> str | None:
+    """Read the charset of a Content-Type, as long as Python knows the encoding.
+
+    Returns:
+        The name of the encoding, None if there is no charset or it is unknown.
+    """
+    for parameter in (content_type or "").split(";")[1:]:
+        name, _, value = parameter.partition("=")
+        if name.strip().lower() == "charset":
+            try:
+                return codecs.lookup(value.strip().strip("'\"")).name
+            except LookupError:
+                return None
+    return None
+
+
+def find_webdav_links(content: bytes) -> list[str]:
+    """Find the links of a WebDAV multistatus listing.
+
+    Returns:
+        The href of every response, in the order of the listing, none if the content is not a multistatus.
+    """
+    root = ET.fromstring(content)
+    namespace = {"d": "DAV:"}
+    links = []
+    for response in root.findall("d:response", namespace):
+        href = response.find("d:href", namespace)
+        if href is not None:
+            links.append(href.text)
+    return links
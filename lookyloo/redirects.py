@@ -0,0 +1,91 @@
+from collections.abc import Iterable
+from typing import Any
+
+REDIRECT_STATUSES = [301, 302, 303, 307, 308]
+
+
+def find_header(headers: list[dict[str, str]], name: str) -> str | None:
+    """Find the value of a HAR header whatever its case, the last one winning as when the headers are made a dict.
+
+    Returns:
+        The value of the header, None if the headers do not have it.
+    """
+    name = name.lower()
+    for header in reversed(headers):
+        if header["name"].lower() == name:
+            return header["value"]
+    return None
+
+
+def parse_refresh_header(header_value):
+    try:
+        refresh = header_value.split(";", 1)
+        target = refresh[1].strip()
+        if int(refresh[0]) <= 15 and target[:4].lower() == "url=":
+            return target[4:]
+    except Exception:
+        # Maybe log that we weren't able to parse the refresh
+        pass
+    return ""
+
+
+class RedirectGraph:
+    """Collect the redirects of a session log, and tell those on the way from the initial URLs from the others.
+
+    The chain is only worked out once every entry was added, so the order of the entries does not matter.
+    """
+
+    def __init__(self, initial_urls: Iterable[str]) -> None:
+        self.initial_urls = set(initial_urls)
+        self.redirects: list[dict[str, Any]] = []
+        self._targets: dict[str, list[str]] = {}
+
+    def _add(self, entry: dict[str, Any], redirecting_to: str) -> None:
+        self.redirects.append(
+            {
+                "status": entry["response"]["status"],
+                "redirecting_url": entry["request"]["url"],
+                "redirecting_ip": entry["serverIPAddress"] if "serverIPAddress" in entry else "Not Available",
+                "redirecting_to": redirecting_to,
+            }
+        )
+        self._targets.setdefault(entry["request"]["url"], []).append(redirecting_to)
+
+    def add_entry(self, entry: dict[str, Any]) -> None:
+        headers = entry["response"]["headers"]
+        refresh = find_header(headers, "refresh")
+        refresh_target = parse_refresh_header(refresh) if refresh else ""
+
+        redirecting_to = None
+        if entry["response"]["status"] in REDIRECT_STATUSES:
+            redirecting_to = entry["response"].get("redirectURL") or find_header(headers, "location") or refresh_target
+            self._add(entry, redirecting_to or "Not Available")
+
+        # Some redirects are hidden in the headers of responses with other status codes
+        if refresh_target and refresh_target != redirecting_to:
+            self._add(entry, refresh_target)
+
+    def chain_urls(self) -> set[str]:
+        """Find every URL reached from the initial URLs through the redirects.
+
+        Returns:
+            The initial URLs and every URL they redirect to, directly or not.
+        """
+        reached = set(self.initial_urls)
+        to_visit = list(reached)
+        while to_visit:
+            for target in self._targets.get(to_visit.pop(), []):
+                if target not in reached:
+                    reached.add(target)
+                    to_visit.append(target)
+        return reached
+
+    def split(self, chain_urls: set[str]) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        """Split the redirects between those on the chain from the initial URLs, and the others.
+
+        Returns:
+            The redirects from the URLs of the chain, then the other redirects, both in the order they were added.
+        """
+        main = [redirect for redirect in self.redirects if redirect["redirecting_url"] in chain_urls]
+        secondary = [redirect for redirect in self.redirects if redirect["redirecting_url"] not in chain_urls]
+        return main, secondary
@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class SafelistCache:
+    """Remember the safelist verdicts of file hashes, so the same content is only looked up once in a while.
+
+    It stands in for the service API as the safelist interface of ``add_extracted``. Verdicts expire after the TTL,
+    and the least recently used ones are evicted first when the cache is full. When given a path, the verdicts are
+    also kept in a SQLite database, so they outlive the service process.
+    """
+
+    def __init__(self, api_interface: Any, ttl: float, max_entries: int, path: str | None = None) -> None:
+        self.api_interface = api_interface
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Wall clock expiries, as the ones kept on disk are read back by another process
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any] | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts (qhash TEXT PRIMARY KEY, expiry REAL, enabled INTEGER, type TEXT)"
+            )
+            self._load()
+
+    def _load(self) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM verdicts WHERE expiry <= ?", (time.time(),))
+            rows = self._db.execute(
+                "SELECT qhash, expiry, enabled, type FROM verdicts ORDER BY expiry DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+            self._db.execute("DELETE FROM verdicts WHERE expiry < ?", (rows[-1][1] if rows else 0,))
+        # The verdicts looked up last are the most recently used
+        for qhash, expiry, enabled, verdict_type in reversed(rows):
+            verdict = None if verdict_type is None else {"enabled": bool(enabled), "type": verdict_type}
+            self._entries[qhash] = (expiry, verdict)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def lookup_safelist(self, qhash: str) -> dict[str, Any] | None:
+        """Look up a hash in the safelist, as the service API does.
+
+        Returns:
+            Whether the safelist entry is enabled and its type, None if the hash is not safelisted.
+        """
+        with self._lock:
+            if qhash in self._entries:
+                expiry, verdict = self._entries[qhash]
+                if expiry > time.time():
+                    self._entries.move_to_end(qhash)
+                    self.hits += 1
+                    return verdict
+                del self._entries[qhash]
+            self.misses += 1
+
+        # Errors are not cached, the next lookup tries the service API again
+        response = self.api_interface.lookup_safelist(qhash)
+        # Only what add_extracted decides on is kept
+        verdict = {"enabled": response["enabled"], "type": response["type"]} if response else None
+        expiry = time.time() + self.ttl
+
+        with self._lock:
+            self._entries[qhash] = (expiry, verdict)
+            self._entries.move_to_end(qhash)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append((self._entries.popitem(last=False)[0],))
+            if self._db:
+                with self._db:
+                    self._db.executemany("DELETE FROM verdicts WHERE qhash = ?", evicted)
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)",
+                        (qhash, expiry, verdict and verdict["enabled"], verdict and verdict["type"]),
+                    )
+        return verdict
+
+    def close(self) -> None:
+        if self._db:
+            self._db.close()
+            self._db = None
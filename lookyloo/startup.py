@@ -0,0 +1,120 @@
+import glob
+import json
+import os
+import subprocess
+import time
+from collections.abc import Callable
+from importlib.metadata import distributions
+from typing import Any
+
+LOOKYLOO_HOME = "/opt/lookyloo"
+
+# Written at image build time, see the Dockerfile
+VERSION_FILE = "lookyloo_version"
+
+# Configuration read by Lookyloo and its capture processes, the sample holds the default of every setting
+GENERIC_CONFIG_FILE = os.path.join("config", "generic.json")
+
+
+def read_lookyloo_version(home: str = LOOKYLOO_HOME) -> str | None:
+    """Read the version of the Lookyloo installed in ``home``, without spawning its virtual environment.
+
+    The version file written at image build time is used first, then the package metadata of the virtual
+    environment. Poetry is only used as a last resort.
+
+    Returns:
+        The version, None if Lookyloo is not installed alongside the service.
+    """
+    try:
+        with open(os.path.join(home, VERSION_FILE)) as f:
+            if version := f.read().strip():
+                return version
+    except OSError:
+        pass
+
+    for site_packages in glob.glob(os.path.join(home, ".venv", "lib", "python*", "site-packages")):
+        for dist in distributions(name="lookyloo", path=[site_packages]):
+            return dist.version
+
+    try:
+        return (
+            subprocess.run(
+                ["poetry", "run", "python", "-c", "from importlib.metadata import version; print(version('lookyloo'))"],
+                cwd=home,
+                capture_output=True,
+                check=False,
+            )
+            .stdout.strip()
+            .decode("UTF8", errors="backslashreplace")
+        )
+    except OSError:
+        # Lookyloo is not installed alongside the service
+        return None
+
+
+def configure_lookyloo(settings: dict[str, Any], home: str = LOOKYLOO_HOME) -> list[str]:
+    """Apply settings to the generic configuration of the Lookyloo installed in ``home``, before it is started.
+
+    Settings absent from the sample configuration are not written, this version of Lookyloo does not know about them.
+
+    Returns:
+        The settings which were not written.
+    """
+    path = os.path.join(home, GENERIC_CONFIG_FILE)
+    with open(f"{path}.sample") as f:
+        known = json.load(f)
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = dict(known)
+
+    config.update({name: value for name, value in settings.items() if name in known})
+    # Lookyloo can be reading the file, only replace it once written
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    return [name for name in settings if name not in known]
+
+
+def start_lookyloo(home: str = LOOKYLOO_HOME) -> None:
+    """Start the Valkey and Lookyloo processes straight from the virtual environment, bypassing poetry."""
+    venv = os.path.join(home, ".venv")
+    start_script = os.path.join(venv, "bin", "start")
+    if not os.path.exists(start_script):
+        subprocess.run("poetry run start".split(), cwd=home)
+        return
+
+    env = dict(os.environ)
+    # The start script launches the other Lookyloo scripts by name, they all live in the virtual environment
+    env["PATH"] = os.pathsep.join([os.path.join(venv, "bin"), env.get("PATH", "")])
+    env["VIRTUAL_ENV"] = venv
+    env["LOOKYLOO_HOME"] = home
+    subprocess.run([start_script], cwd=home, env=env)
+
+
+def wait_until_ready(
+    is_ready: Callable[[], bool],
+    timeout: float,
+    interval: float = 0.5,
+    on_wait: Callable[[float], None] | None = None,
+) -> None:
+    """Wait for a readiness probe to succeed.
+
+    Args:
+        is_ready: Probe returning True once the service is ready.
+        timeout: How long to wait for, in seconds.
+        interval: Delay between two probes, in seconds.
+        on_wait: Called with the time waited so far each time the probe fails.
+
+    Raises:
+        TimeoutError: If the probe did not succeed before the timeout.
+    """
+    start = time.monotonic()
+    while not is_ready():
+        waited = time.monotonic() - start
+        if waited >= timeout:
+            raise TimeoutError(f"Lookyloo was not ready after {timeout} seconds")
+        if on_wait:
+            on_wait(waited)
+        time.sleep(min(interval, timeout - waited))
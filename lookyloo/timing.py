@@ -0,0 +1,77 @@
+import bisect
+import time
+
+# Upper bounds, in seconds, of the buckets phase durations are counted in
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+
+class PhaseTimer:
+    """Record how long consecutive phases take."""
+
+    def __init__(self) -> None:
+        self.start = self._last = time.monotonic()
+        self.phases: dict[str, float] = {}
+        # Durations measured within the phases, reported with them but not part of the total
+        self.details: dict[str, float] = {}
+        # Wall clock time of events, to compare with the timestamps recorded by other processes
+        self.marks: dict[str, float] = {}
+
+    def lap(self, phase: str) -> float:
+        """Close the current phase, and start the next one.
+
+        Returns:
+            The duration of the phase, in seconds.
+        """
+        now = time.monotonic()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self._last
+        self._last = now
+        return self.phases[phase]
+
+    def mark(self, event: str, timestamp: float | None = None) -> None:
+        """Record when an event happened, now if no timestamp is given."""
+        self.marks[event] = time.time() if timestamp is None else timestamp
+
+    @property
+    def total(self) -> float:
+        return self._last - self.start
+
+    def __str__(self) -> str:
+        return ", ".join(f"{phase}={duration:.2f}s" for phase, duration in {**self.phases, **self.details}.items())
+
+
+class PhaseHistogram:
+    """Aggregate the phase durations of many tasks into cumulative histograms."""
+
+    def __init__(self) -> None:
+        self.tasks = 0
+        self.counts: dict[str, list[int]] = {}
+        self.sums: dict[str, float] = {}
+
+    def observe(self, phases: dict[str, float]) -> None:
+        self.tasks += 1
+        for phase, duration in phases.items():
+            counts = self.counts.setdefault(phase, [0] * (len(HISTOGRAM_BUCKETS) + 1))
+            counts[bisect.bisect_left(HISTOGRAM_BUCKETS, duration)] += 1
+            self.sums[phase] = self.sums.get(phase, 0) + duration
+
+    def quantile(self, phase: str, quantile: float) -> float:
+        """Estimate a quantile of a phase duration, as the upper bound of the bucket it falls in.
+
+        Returns:
+            The upper bound in seconds, infinity if the quantile falls past the last bucket.
+        """
+        counts = self.counts[phase]
+        rank = quantile * sum(counts)
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> str:
+        return "; ".join(
+            f"{phase}: n={sum(counts)} mean={self.sums[phase] / sum(counts):.2f}s "
+            f"p50<={self.quantile(phase, 0.5)}s p95<={self.quantile(phase, 0.95)}s"
+            for phase, counts in self.counts.items()
+        )
@@ -0,0 +1,95 @@
+"""Measure the latency added by waiting on Lookyloo captures.
+
+A stand-in Lookyloo reports a capture as queued, ongoing then done following randomized durations, on a virtual clock
+so the benchmark runs instantly. The added latency is the time between the capture being done and the wait returning.
+
+Usage: python tests/benchmarks/bench_capture_wait.py [--captures 1000] [--seed 0]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from lookyloo.capture import (
+    CAPTURE_STATUS_DONE,
+    CAPTURE_STATUS_ONGOING,
+    CAPTURE_STATUS_QUEUED,
+    CaptureWaiter,
+)
+
+
+class StandInLookyloo:
+    def __init__(self, clock, queued_for, ongoing_for):
+        self.clock = clock
+        self.ongoing_at = clock.now + queued_for
+        self.done_at = self.ongoing_at + ongoing_for
+        self.status_calls = 0
+
+    def get_status(self, _uuid):
+        self.status_calls += 1
+        if self.clock.now < self.ongoing_at:
+            return {"status_code": CAPTURE_STATUS_QUEUED}
+        if self.clock.now < self.done_at:
+            return {"status_code": CAPTURE_STATUS_ONGOING}
+        return {"status_code": CAPTURE_STATUS_DONE}
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+
+class VirtualWaiter(CaptureWaiter):
+    def __init__(self, clock, notified, **kwargs):
+        super().__init__(None, **kwargs)
+        self.clock = clock
+        self.notified = notified
+
+    def _now(self):
+        return self.clock.now
+
+    def _sleep(self, delay):
+        wake_up = self.clock.now + delay
+        if self.notified and self.clock.now < self.lookyloo.done_at <= wake_up:
+            # The capture index notification wakes the wait up when the capture is done
+            wake_up = self.lookyloo.done_at
+        self.clock.now = wake_up
+
+
+def run(name, captures, seed, notified=False, **kwargs):
+    rng = random.Random(seed)
+    clock = VirtualClock()
+    waiter = VirtualWaiter(clock, notified, **kwargs)
+    added_latency = []
+    status_calls = 0
+    for _ in range(captures):
+        clock.now = 0.0
+        waiter.lookyloo = StandInLookyloo(clock, rng.choice([0, 0, rng.uniform(0, 5)]), rng.uniform(2, 20))
+        assert waiter.wait("uuid", 120) == CAPTURE_STATUS_DONE
+        added_latency.append(clock.now - waiter.lookyloo.done_at)
+        status_calls += waiter.lookyloo.status_calls
+
+    quantiles = statistics.quantiles(added_latency, n=100)
+    print(
+        f"{name:<32} p50={quantiles[49] * 1000:7.1f}ms p99={quantiles[98] * 1000:7.1f}ms "
+        f"status calls/capture={status_calls / captures:5.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--captures", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run("fixed 1s polling", args.captures, args.seed, initial_interval=1, max_interval=1, backoff=1)
+    run("backoff 0.1s-0.5s", args.captures, args.seed, initial_interval=0.1, max_interval=0.5)
+    run("backoff 0.1s-5s + notifications", args.captures, args.seed, notified=True, max_interval=5)
+
+
+if __name__ == "__main__":
+    main()
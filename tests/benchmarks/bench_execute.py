@@ -0,0 +1,139 @@
+"""Measure the end-to-end cost of analysing captures of various sizes, without network access.
+
+The service runs against a local stand-in Lookyloo serving generated captures. Each capture is analysed in a fresh
+process, reporting the wall time of execute, the peak RSS of the process and the time spent in each phase.
+
+Usage: python tests/benchmarks/bench_execute.py [--entries 10 500 5000] [--seed 0]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+os.environ.setdefault(
+    "SERVICE_MANIFEST_PATH", os.path.join(os.path.dirname(__file__), "..", "..", "service_manifest.yml")
+)
+
+from assemblyline.common.identify import Identify
+from assemblyline.odm.messages.task import Task as ServiceTask
+from assemblyline_v4_service.common.helper import get_service_manifest
+from assemblyline_v4_service.common.request import ServiceRequest
+from assemblyline_v4_service.common.task import Task
+
+from lookyloo.lookyloo import Lookyloo
+from tests.benchmarks.standin_lookyloo import StandInLookyloo, generate_export
+
+FILEINFO_KEYS = ["magic", "md5", "mime", "sha1", "sha256", "size", "type", "uri_info"]
+
+
+def capture_url(entries):
+    return f"http://bench.invalid/{entries}/"
+
+
+def execute_capture(lookyloo_url, url, config=None, params=None):
+    """Run the service on a URI file for ``url``, against the Lookyloo at ``lookyloo_url``.
+
+    The service configuration and the submission parameters are the defaults of the manifest, updated with
+    ``config`` and ``params``.
+
+    Returns:
+        The wall time of execute, the service task, and the durations of the Timing section. The files of the task
+        are removed once it returns.
+    """
+    environ = dict(os.environ)
+    # Safelist lookups go to the stand-in too
+    os.environ["SERVICE_API_HOST"] = lookyloo_url
+    # The task files and working directory of the service all go in a directory of their own
+    os.environ["TASKING_DIR"] = tasking_dir = tempfile.mkdtemp()
+    service = Lookyloo({"lookyloo_url": lookyloo_url, **(config or {})})
+    service.start()
+    try:
+        uri_file = os.path.join(tasking_dir, "uri")
+        with open(uri_file, "w") as f:
+            f.write(f"# Assemblyline URI file\nuri: {url}\n")
+        fileinfo = Identify(use_cache=False).fileinfo(uri_file, skip_fuzzy_hashes=True, calculate_entropy=False)
+        # Tasks find their file by its hash
+        os.rename(uri_file, os.path.join(tasking_dir, fileinfo["sha256"]))
+
+        manifest = get_service_manifest()
+        task = Task(
+            ServiceTask(
+                {
+                    "sid": 1,
+                    "metadata": {},
+                    "deep_scan": False,
+                    "service_name": manifest["name"],
+                    "service_config": {
+                        **{param["name"]: param["default"] for param in manifest["submission_params"]},
+                        **(params or {}),
+                    },
+                    "fileinfo": {key: value for key, value in fileinfo.items() if key in FILEINFO_KEYS},
+                    "filename": fileinfo["sha256"],
+                    "min_classification": "TLP:C",
+                    "max_files": 501,
+                    "ttl": 3600,
+                }
+            )
+        )
+        request = ServiceRequest(task)
+        service._working_directory = task.working_directory
+
+        start = time.perf_counter()
+        service.execute(request)
+        elapsed = time.perf_counter() - start
+
+        phases = {}
+        for section in request.result.sections:
+            if section.title_text == "Timing":
+                phases = json.loads(section.body)
+        return elapsed, task, phases
+    finally:
+        service.stop()
+        shutil.rmtree(tasking_dir, ignore_errors=True)
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+def _run_fixture(lookyloo_url, entries, results):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    elapsed, _, phases = execute_capture(lookyloo_url, capture_url(entries))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((elapsed, baseline, peak, phases))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10, 500, 5000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with StandInLookyloo() as server:
+        for entries in args.entries:
+            export = generate_export(capture_url(entries), entries, args.seed)
+            server.add_capture(capture_url(entries), export)
+
+            # A fresh process for each capture, so the peak RSS is its own
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_run_fixture, args=(server.url, entries, results))
+            process.start()
+            process.join()
+            if process.exitcode:
+                sys.exit(f"The analysis of the {entries} entries capture failed")
+            elapsed, baseline, peak, phases = results.get()
+
+            print(
+                f"{entries:>5} entries ({len(export) / 1024 / 1024:6.1f} MiB export): "
+                f"execute={elapsed:7.2f}s peak RSS={peak / 1024:7.1f} MiB (+{(peak - baseline) / 1024:.1f} MiB)"
+            )
+            print("      " + ", ".join(f"{phase}={duration:.3f}s" for phase, duration in phases.items()))
+
+
+if __name__ == "__main__":
+    main()
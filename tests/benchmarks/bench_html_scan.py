@@ -0,0 +1,97 @@
+"""Compare the streaming page scan with the BeautifulSoup parsing it replaced, on large pages.
+
+Each page is parsed in a fresh process, reporting the time taken and how much the peak RSS grew while parsing.
+
+Usage: python tests/benchmarks/bench_html_scan.py [--size-mib 5] [--repeat 3]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from bs4 import BeautifulSoup
+
+from lookyloo.page import scan_html
+
+
+def obfuscated_page(size, rng):
+    # A phishing kit style page: a short head, then a large packed script and deeply nested markup
+    blob = "".join(rng.choices(string.ascii_letters + string.digits, k=size // 2))
+    markup = "<div class='x'><span>" + "</span><span>".join(rng.choices(string.ascii_letters, k=size // 40)) + "</span>"
+    head = "<html><head><meta charset='utf-8'><title>Sign in to your account</title></head><body>"
+    return f"{head}<script>var p='{blob}';eval(atob(p));</script>{markup}</div></body></html>".encode()
+
+
+def untitled_page(size, rng):
+    return obfuscated_page(size, rng).replace(b"<title>Sign in to your account</title>", b"")
+
+
+def listing_page(size, rng):
+    rows = []
+    total = 0
+    while total < size:
+        name = "".join(rng.choices(string.ascii_lowercase, k=12))
+        rows.append(f"<tr><td><a href='{name}.zip'>{name}.zip</a></td><td>2024-01-01 00:00</td><td>1.2M</td></tr>")
+        total += len(rows[-1])
+    return (
+        f"<html><head><title>Index of /files</title></head><body><table>{''.join(rows)}</table></body></html>".encode()
+    )
+
+
+def soup_path(data):
+    soup = BeautifulSoup(data, features="lxml")
+    # A NavigableString keeps a reference to the whole tree
+    title = str(soup.title.string) if soup.title and soup.title.string is not None else None
+    return title, [a["href"] for a in soup.find_all("a", href=True)]
+
+
+def scan_path(data):
+    page = scan_html(data)
+    return page.title, page.hrefs
+
+
+def _measure(parse, data, repeat, results):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        title, hrefs = parse(data)
+        timings.append(time.perf_counter() - start)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((min(timings), peak - baseline, title, len(hrefs)))
+
+
+def measure(parse, data, repeat):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(parse, data, repeat, results))
+    process.start()
+    process.join()
+    return results.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mib", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    size = int(args.size_mib * 1024 * 1024)
+    for name, generate in [("obfuscated", obfuscated_page), ("untitled", untitled_page), ("listing", listing_page)]:
+        data = generate(size, random.Random(0))
+        for path, parse in [("soup", soup_path), ("scan", scan_path)]:
+            elapsed, rss_growth, title, hrefs = measure(parse, data, args.repeat)
+            print(
+                f"{name:<10} {len(data) / 1024 / 1024:5.1f} MiB {path:<4}: {elapsed * 1000:8.1f}ms "
+                f"peak RSS +{rss_growth / 1024:6.1f} MiB  title={title!r} hrefs={hrefs}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare serial and pooled identification of the response bodies of a synthetic HAR.
+
+Each body goes through the same steps as in the service: decoding and hashing it to a temporary file, then
+identifying its type, either inline or in a thread pool gathered once every entry has been processed.
+
+Usage: python tests/benchmarks/bench_identify_pool.py [--entries 500] [--workers 1 2 4]
+"""
+
+import argparse
+import base64
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from assemblyline.common.identify import Identify
+
+from lookyloo.har import decode_content
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+
+
+def generate_bodies(entries, seed=0):
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(entries):
+        size = rng.choice([1, 4, 16, 64, 256]) * 1024
+        kind = rng.choice(["html", "js", "json", "png", "binary"])
+        if kind == "html":
+            body = (f"<html><head><title>Page {i}</title></head><body>" + "<p>text</p>" * (size // 11)).encode()
+        elif kind == "js":
+            body = (f"var a{i} = function(b) {{ return b + 1; }};\n" * (size // 40)).encode()
+        elif kind == "json":
+            body = ('{"key": "value", "list": [1, 2, 3]}, ' * (size // 36)).encode()
+        elif kind == "png":
+            body = PNG_HEADER + rng.randbytes(size)
+        else:
+            body = rng.randbytes(size)
+        bodies.append(base64.b64encode(body).decode())
+    return bodies
+
+
+def identify_type(identify, path):
+    return identify.fileinfo(path, generate_hashes=False, skip_fuzzy_hashes=True, calculate_entropy=False)
+
+
+def run(name, identify, bodies, working_directory, pool=None):
+    start = time.perf_counter()
+    results = []
+    for body in bodies:
+        with tempfile.NamedTemporaryFile(dir=working_directory, delete=False, mode="wb") as content_file:
+            fileinfo = decode_content(body, "base64", content_file)
+        if pool:
+            results.append((fileinfo, pool.submit(identify_type, identify, content_file.name)))
+        else:
+            fileinfo.update(identify_type(identify, content_file.name))
+            results.append((fileinfo, None))
+    for fileinfo, future in results:
+        if future:
+            fileinfo.update(future.result())
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {elapsed:6.2f}s ({elapsed / len(bodies) * 1000:5.2f}ms/entry)")
+    return [fileinfo["type"] for fileinfo, _ in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    identify = Identify(use_cache=False)
+    bodies = generate_bodies(args.entries)
+    with tempfile.TemporaryDirectory() as working_directory:
+        expected = run("serial", identify, bodies, working_directory)
+        for workers in args.workers:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                types = run(f"{workers} worker{'s' if workers > 1 else ''}", identify, bodies, working_directory, pool)
+            # The results are gathered in submission order, the output is identical
+            assert types == expected
+
+
+if __name__ == "__main__":
+    main()
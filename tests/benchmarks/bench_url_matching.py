@@ -0,0 +1,101 @@
+"""Compare matching URLs against each exclusion pattern in turn with the combined matcher.
+
+Also compares searching Content-Disposition headers with string patterns, going through the cache of the re module,
+and with precompiled ones.
+
+Usage: python tests/benchmarks/bench_url_matching.py [--patterns 1000] [--urls 10000]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from lookyloo.lookyloo import ASCII_FILENAME_REGEX, UTF8_FILENAME_REGEX
+from lookyloo.matching import UrlMatcher
+
+
+def generate_patterns(count, rng):
+    patterns = []
+    for index in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            patterns.append(rf"https?://(www\.)?host{index}\.com/")
+        elif kind < 0.9:
+            patterns.append(rf".*\.domain{index}\.net/")
+        else:
+            patterns.append(rf"https://cdn{index}\.example\.com/.*\.js$")
+    return patterns
+
+
+def generate_urls(count, patterns, rng):
+    urls = []
+    for _ in range(count):
+        # Most submitted URLs are not excluded
+        index = rng.randrange(len(patterns) * 10)
+        host = rng.choice(
+            [f"host{index}.com", f"www.host{index}.com", f"a.domain{index}.net", f"cdn{index}.example.com"]
+        )
+        urls.append(f"{rng.choice(['http', 'https'])}://{host}/{rng.choice(['', 'index.html', 'lib.js'])}")
+    return urls
+
+
+def bench(name, function, items):
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    elapsed = time.perf_counter() - start
+    print(f"{name:<40} {elapsed * 1e6 / len(items):8.2f}us per item")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patterns", type=int, default=1000)
+    parser.add_argument("--urls", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    patterns = generate_patterns(args.patterns, rng)
+    urls = generate_urls(args.urls, patterns, rng)
+
+    start = time.perf_counter()
+    compiled = [re.compile(pattern) for pattern in patterns]
+    print(f"{'compile each pattern':<40} {(time.perf_counter() - start) * 1000:8.2f}ms")
+    start = time.perf_counter()
+    matcher = UrlMatcher(patterns)
+    print(f"{'build the combined matcher':<40} {(time.perf_counter() - start) * 1000:8.2f}ms")
+
+    sequential = bench("each pattern in turn", lambda url: any(pattern.match(url) for pattern in compiled), urls)
+    combined = bench("combined matcher", matcher.match, urls)
+    assert sequential == combined
+    print(f"{sum(combined)} of {len(urls)} URLs excluded")
+
+    headers = [
+        rng.choice(
+            [
+                f'attachment; filename="file{index}.zip"',
+                f"attachment; filename*=UTF-8''file%20{index}.pdf",
+                f"inline; filename=file{index}.exe; size=10",
+            ]
+        )
+        for index in range(args.urls)
+    ]
+    ascii_pattern, utf8_pattern = ASCII_FILENAME_REGEX.pattern, UTF8_FILENAME_REGEX.pattern
+    bench(
+        "filename regexes, string patterns",
+        lambda header: (re.search(ascii_pattern, header), re.search(utf8_pattern, header)),
+        headers,
+    )
+    bench(
+        "filename regexes, precompiled",
+        lambda header: (ASCII_FILENAME_REGEX.search(header), UTF8_FILENAME_REGEX.search(header)),
+        headers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""A local stand-in for Lookyloo, serving generated captures so the service can run without network access.
+
+It implements the pylookyloo endpoints used by the service, and answers the safelist lookups of the service server
+with "not found".
+"""
+
+import base64
+import gzip
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid as uuid_module
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Self
+
+from PIL import Image
+
+# Entries of every fixture body kind are generated in this proportion
+BODY_KINDS = ["html", "js", "js", "json", "css", "png", "binary"]
+# Every so many entries, the body is a large download instead
+LARGE_BODY_INTERVAL = 250
+LARGE_BODY_SIZE = 1024 * 1024
+
+
+def _body(rng: random.Random, kind: str, size: int, index: int) -> tuple[bytes, str]:
+    if kind == "html":
+        return (f"<html><head><title>Page {index}</title></head><body>" + "<p>text</p>" * (size // 11)).encode(), (
+            "text/html"
+        )
+    if kind == "js":
+        return (f"var a{index} = function(b) {{ return b + 1; }};\n" * (size // 40)).encode(), "application/javascript"
+    if kind == "json":
+        return ('{"key": "value", "list": [1, 2, 3]}, ' * (size // 36)).encode(), "application/json"
+    if kind == "css":
+        return (f".c{index} {{ color: #{index % 0xFFFFFF:06x}; }}\n" * (size // 24)).encode(), "text/css"
+    if kind == "png":
+        return b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + rng.randbytes(size), "image/png"
+    return rng.randbytes(size), "application/octet-stream"
+
+
+def generate_har(url: str, entries: int, seed: int = 0) -> dict:
+    """Generate the session log of a capture of ``url`` with the given number of entries.
+
+    Most bodies are small, about one in ten is a copy of a previous one, like a shared script, and every
+    ``LARGE_BODY_INTERVAL`` entries the body is a large binary download.
+
+    Returns:
+        The session log, as Lookyloo stores it.
+    """
+    rng = random.Random(seed)
+    har_entries = []
+    bodies = []
+    for index in range(entries):
+        if index and index % LARGE_BODY_INTERVAL == 0:
+            body, mime_type = rng.randbytes(LARGE_BODY_SIZE), "application/octet-stream"
+        elif bodies and rng.random() < 0.1:
+            body, mime_type = rng.choice(bodies)
+        else:
+            kind = "html" if index == 0 else rng.choice(BODY_KINDS)
+            body, mime_type = _body(rng, kind, rng.choice([1, 2, 4, 16, 64]) * 1024, index)
+            bodies.append((body, mime_type))
+
+        content = {"size": len(body), "mimeType": mime_type}
+        if mime_type.startswith(("text/", "application/javascript", "application/json")):
+            content["text"] = body.decode()
+        else:
+            content["text"] = base64.b64encode(body).decode()
+            content["encoding"] = "base64"
+
+        entry_url = url if index == 0 else f"{url.rstrip('/')}/resource/{index}"
+        har_entries.append(
+            {
+                "startedDateTime": "2024-01-01T00:00:00.000Z",
+                "time": rng.uniform(1, 100),
+                "request": {
+                    "method": "GET",
+                    "url": entry_url,
+                    "httpVersion": "HTTP/1.1",
+                    "headers": [{"name": "Accept", "value": "*/*"}, {"name": ":authority", "value": "bench.invalid"}],
+                },
+                "response": {
+                    "status": 200,
+                    "statusText": "OK",
+                    "httpVersion": "HTTP/1.1",
+                    "headers": [
+                        {"name": "Content-Type", "value": mime_type},
+                        {"name": "Content-Length", "value": str(len(body))},
+                    ],
+                    "content": content,
+                    "redirectURL": "",
+                },
+                "serverIPAddress": "127.0.0.1",
+            }
+        )
+
+    return {
+        "log": {
+            "version": "1.2",
+            "creator": {"name": "Stand-in Lookyloo", "version": "1.0"},
+            "pages": [{"startedDateTime": "2024-01-01T00:00:00.000Z", "id": "page@1", "title": url}],
+            "entries": har_entries,
+        }
+    }
+
+
+def generate_export(url: str, entries: int, seed: int = 0, har: dict | None = None, html: str | None = None) -> bytes:
+    """Generate the complete capture export of ``url``, as returned by Lookyloo.
+
+    The session log and the rendered page are generated too, unless ``har`` or ``html`` are given.
+
+    Returns:
+        The zipped export.
+    """
+    screenshot = io.BytesIO()
+    Image.new("RGB", (1280, 720), (255, 255, 255)).save(screenshot, format="PNG")
+    favicon = io.BytesIO()
+    Image.new("RGB", (16, 16), (0, 0, 255)).save(favicon, format="ICO")
+
+    export = io.BytesIO()
+    with zipfile.ZipFile(export, "w") as zipped_file:
+        zipped_file.writestr(
+            "capture/0.har.gz", gzip.compress(json.dumps(har or generate_har(url, entries, seed)).encode())
+        )
+        zipped_file.writestr("capture/0.png", screenshot.getvalue())
+        zipped_file.writestr("capture/0.potential_favicon.ico", favicon.getvalue())
+        zipped_file.writestr("capture/0.html", html or f"<html><head><title>{url}</title></head><body></body></html>")
+        zipped_file.writestr("capture/0.cookies.json", "[]")
+        zipped_file.writestr("capture/0.storage.json", json.dumps({"cookies": [], "origins": []}))
+    return export.getvalue()
+
+
+class StandInLookyloo(ThreadingHTTPServer):
+    """Serve the captures registered with ``add_capture``.
+
+    Submitted captures stay queued for ``queued_for`` seconds, then ongoing for ``ongoing_for`` seconds.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, queued_for: float = 0, ongoing_for: float = 0) -> None:
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.queued_for = queued_for
+        self.ongoing_for = ongoing_for
+        self.exports: dict[str, bytes] = {}
+        self.redirects: dict[str, list[str]] = {}
+        self.captures: dict[str, tuple[str, float]] = {}
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def add_capture(self, url: str, export: bytes, redirects: list[str] | None = None) -> None:
+        self.exports[url] = export
+        if redirects:
+            self.redirects[url] = redirects
+
+    def __enter__(self) -> Self:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def status(self, uuid: str) -> int:
+        if uuid not in self.captures:
+            return -1
+        elapsed = time.monotonic() - self.captures[uuid][1]
+        if elapsed < self.queued_for:
+            return 0
+        if elapsed < self.queued_for + self.ongoing_for:
+            return 2
+        return 1
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    server: StandInLookyloo
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, body: bytes, content_type: str = "application/json", status: int = 200) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, data, status: int = 200) -> None:
+        self._send(json.dumps(data).encode(), status=status)
+
+    def do_HEAD(self) -> None:
+        self._send(b"", content_type="text/html")
+
+    def do_POST(self) -> None:
+        settings = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path != "/submit" or settings["url"] not in self.server.exports:
+            self._send_json(None, status=404)
+            return
+        uuid = str(uuid_module.uuid4())
+        self.server.captures[uuid] = (settings["url"], time.monotonic())
+        self._send_json(uuid)
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/api/v1/"):
+            # Service server lookups, nothing is known to it
+            self._send_json(
+                {"api_response": None, "api_error_message": "Not found", "api_server_version": "4.0.0"}, status=404
+            )
+            return
+
+        match = re.fullmatch(r"/(json|bin|tree)/([^/]+)/([a-z_]+)", path)
+        if not match or match.group(2) not in self.server.captures:
+            self._send_json(None, status=404)
+            return
+        endpoint, uuid = match.group(3), match.group(2)
+        if endpoint == "status":
+            self._send_json({"status_code": self.server.status(uuid)})
+            return
+
+        with zipfile.ZipFile(io.BytesIO(self.server.exports[self.server.captures[uuid][0]])) as zipped_file:
+            if endpoint == "export":
+                self._send(self.server.exports[self.server.captures[uuid][0]], content_type="application/zip")
+            elif endpoint == "cookies":
+                self._send(zipped_file.read("capture/0.cookies.json"))
+            elif endpoint == "stats":
+                self._send_json({"total_hostnames": 1, "total_urls": 1, "total_cookies_received": 0})
+            elif endpoint == "redirects":
+                url = self.server.captures[uuid][0]
+                self._send_json({"response": {"url": url, "redirects": self.server.redirects.get(url, [url])}})
+            else:
+                self._send_json(None, status=404)
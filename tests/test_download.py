@@ -0,0 +1,89 @@
+import hashlib
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from lookyloo.download import ChargedWriter, DiskBudget, cookieless_session, write_content
+
+CONTENT = b"0123456789" * 10
+
+
+@pytest.mark.parametrize(
+    "max_size, expected",
+    [
+        (None, CONTENT),
+        (100, CONTENT),
+        (25, CONTENT[:25]),
+        (0, b""),
+    ],
+)
+def test_write_content(max_size, expected):
+    destination = io.BytesIO()
+    chunks = (CONTENT[offset : offset + 10] for offset in range(0, len(CONTENT), 10))
+    content_info = write_content(chunks, destination, max_size)
+
+    assert destination.getvalue() == expected
+    assert content_info["sha256"] == hashlib.sha256(expected).hexdigest()
+    assert content_info["size"] == len(expected)
+    assert content_info["truncated"] == (len(expected) < len(CONTENT))
+
+
+def test_disk_budget():
+    budget = DiskBudget(100)
+    assert budget.fits(100)
+    budget.spend(60)
+    assert budget.fits(40)
+    assert not budget.fits(41)
+    assert budget.remaining == 40
+    assert DiskBudget().fits(10**12)
+    assert DiskBudget().remaining is None
+
+
+def test_charged_writer():
+    budget = DiskBudget(100)
+    destination = io.StringIO()
+    writer = ChargedWriter(destination, budget)
+    writer.write('{"title": "Café"}')
+    assert destination.getvalue() == '{"title": "Café"}'
+    # Charged the bytes of the UTF-8 text
+    assert budget.used == 18
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        # Echo the cookies received, and set one for the next requests, after a redirect for the first one
+        body = (self.headers.get("Cookie") or "").encode()
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/")
+        else:
+            self.send_response(200)
+        self.send_header("Set-Cookie", f"tracker={self.path.strip('/') or 'root'}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_cookieless_session():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CookieHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with cookieless_session() as session:
+            assert session.get(f"{url}/task1").text == ""
+            # Neither the cookies of a previous request are sent, nor kept
+            assert session.get(f"{url}/task2").text == ""
+            assert len(session.cookies) == 0
+            # Those of the request itself are
+            assert session.get(f"{url}/task3", cookies={"given": "1"}).text == "given=1"
+            # And so are the ones set along its redirects
+            assert session.get(f"{url}/redirect").text == "tracker=redirect"
+            assert len(session.cookies) == 0
+    finally:
+        server.shutdown()
+        server.server_close()
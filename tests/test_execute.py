@@ -0,0 +1,275 @@
+import base64
+import hashlib
+import json
+from datetime import UTC, datetime
+
+import pytest
+from assemblyline.common.exceptions import RecoverableError
+
+from lookyloo.lookyloo import Lookyloo
+from lookyloo.ontology import ConnectionCollector
+from tests.benchmarks.bench_execute import execute_capture
+from tests.benchmarks.standin_lookyloo import StandInLookyloo, generate_export, generate_har
+
+URL = "http://bench.invalid/smoke/"
+
+
+def test_execute_against_standin_lookyloo():
+    with StandInLookyloo(queued_for=0.2, ongoing_for=0.2) as server:
+        server.add_capture(URL, generate_export(URL, 10))
+        _, task, phases = execute_capture(server.url, URL)
+
+    sections = [section.title_text for section in task.result.sections]
+    assert "Document Titles" in sections
+
+    assert [extracted["name"] for extracted in task.extracted] == [URL]
+    assert "session.har" in [supplementary["name"] for supplementary in task.supplementary]
+    assert {"capture queued", "capture ongoing", "session log", "total"} <= set(phases)
+    # Without Lacus, when the capture started is not known
+    assert "browser launch" not in phases
+
+
+def test_execute_without_timing_log():
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 3))
+        _, _, phases = execute_capture(server.url, URL, {"timing_log_interval": 0})
+
+    assert "total" in phases
+
+
+def test_execute_with_compressed_session_log():
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 10))
+        _, task, _ = execute_capture(server.url, URL, {"har_compression": "gzip", "har_index": True})
+
+    # The files of the task are gone, only what was attached is left to check
+    names = [supplementary["name"] for supplementary in task.supplementary]
+    assert "session.har.gz" in names
+    assert "session_index.jsonl" in names
+    assert "session.har" not in names
+
+
+def test_execute_over_the_disk_budget():
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 10))
+        _, task, _ = execute_capture(server.url, URL, {"task_disk_budget": 1})
+
+    sections = [section.title_text for section in task.result.sections]
+    assert "Dropped Content (over the disk budget of 1 bytes)" in sections
+    assert task.extracted == []
+    assert task.partial
+
+
+def test_execute_budget_checks_the_decoded_size():
+    har = generate_har(URL, 3)
+    # Sizes declared by the browser can be far off, only the decoded body is written
+    har["log"]["entries"][1]["response"]["content"]["size"] = 10**12
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 3, har=har))
+        _, task, _ = execute_capture(server.url, URL, {"task_disk_budget": 10 * 1024 * 1024})
+
+    sections = [section.title_text for section in task.result.sections]
+    assert not any(title.startswith("Dropped Content") for title in sections)
+
+
+def test_execute_without_time_to_capture():
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 10))
+        # Captures are predicted to take longer than the service timeout
+        config = {"admission_capture_estimate": 1000}
+        _, task, phases = execute_capture(server.url, URL, config)
+
+        with pytest.raises(RecoverableError):
+            execute_capture(server.url, URL, {**config, "admission_action": "requeue"})
+
+    assert "Capture not attempted" in [section.title_text for section in task.result.sections]
+    assert task.partial
+    assert "capture admission" in phases
+    assert "capture submit" not in phases
+
+
+def test_execute_webdav_listing_at_submitted_url():
+    body = (
+        '<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">'
+        "<d:response><d:href>/smoke/</d:href></d:response><d:response><d:href>/smoke/file.txt</d:href></d:response>"
+        "</d:multistatus>"
+    )
+    har = generate_har(URL, 3)
+    har["log"]["entries"][0]["response"].update(
+        status=207,
+        headers=[{"name": "Content-Type", "value": "text/xml"}],
+        content={"size": len(body), "mimeType": "text/xml", "text": body},
+    )
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 3, har=har))
+        _, task, _ = execute_capture(server.url, URL)
+
+    webdav_sections = [section for section in task.result.sections if section.title_text == "WebDav Listing Detected"]
+    assert len(webdav_sections) == 1
+    assert "http://bench.invalid/smoke/file.txt" in webdav_sections[0].body
+
+
+def test_execute_listing_after_redirect():
+    listing_url = URL + "files/"
+    listing = '<html><head><title>Index of /smoke/files</title></head><body><a href="a.txt">a.txt</a></body></html>'
+    har = generate_har(URL, 3)
+    har["log"]["entries"][0]["response"].update(
+        status=301,
+        headers=[{"name": "Location", "value": listing_url}],
+        content={"size": 0, "mimeType": ""},
+        redirectURL=listing_url,
+    )
+    har["log"]["entries"][1]["request"]["url"] = listing_url
+    har["log"]["entries"][1]["response"]["content"] = {"size": len(listing), "mimeType": "text/html", "text": listing}
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 3, har=har, html=listing), redirects=[listing_url])
+        _, task, _ = execute_capture(server.url, URL)
+
+    # The listing is only reported once, from the rendered page
+    sections = [section.title_text for section in task.result.sections]
+    assert sections.count("Open Directory Detected") == 1
+
+
+@pytest.mark.parametrize("use_capture_cache, prefetched", [(True, [URL + "a.txt"]), (False, [])])
+def test_execute_prefetches_listed_urls(use_capture_cache, prefetched):
+    listing = (
+        "<html><head><title>Index of /smoke</title></head>"
+        '<body><a href="a.txt">a.txt</a><a href="excluded.txt">excluded.txt</a></body></html>'
+    )
+    config = {
+        "capture_cache_ttl": 60,
+        "max_inflight_captures": 3,
+        "do_not_download_regexes": [r".*/excluded\.txt$"],
+    }
+    with StandInLookyloo() as server:
+        for url in [URL, URL + "a.txt", URL + "excluded.txt"]:
+            server.add_capture(url, generate_export(url, 3, html=listing if url == URL else None))
+        execute_capture(server.url, URL, config, {"use_capture_cache": use_capture_cache})
+        captured = [url for url, _ in server.captures.values()]
+
+    assert captured == [URL, *prefetched]
+
+
+def test_execute_deduplicates_bodies(monkeypatch):
+    script = b"var shared = 1;\n" * 64
+    har = generate_har(URL, 4)
+    # The same script, held as text and as base64
+    for index in [1, 2]:
+        har["log"]["entries"][index]["response"]["content"] = {
+            "size": len(script),
+            "mimeType": "application/javascript",
+            "text": script.decode(),
+        }
+    har["log"]["entries"][3]["response"]["content"] = {
+        "size": len(script),
+        "mimeType": "application/javascript",
+        "text": base64.b64encode(script).decode(),
+        "encoding": "base64",
+    }
+
+    # Every body written is identified once, record what was written and what the connections tell
+    written = []
+    identify_type = Lookyloo._identify_type
+
+    def record_identify(self, path):
+        with open(path, "rb") as f:
+            written.append(hashlib.sha256(f.read()).hexdigest())
+        return identify_type(self, path)
+
+    connections = []
+    add = ConnectionCollector.add
+
+    def record_connection(self, http_details):
+        connections.append(http_details)
+        add(self, http_details)
+
+    monkeypatch.setattr(Lookyloo, "_identify_type", record_identify)
+    monkeypatch.setattr(ConnectionCollector, "add", record_connection)
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 4, har=har))
+        _, task, _ = execute_capture(server.url, URL)
+
+    script_fileinfo = {
+        "md5": hashlib.md5(script).hexdigest(),
+        "sha1": hashlib.sha1(script).hexdigest(),
+        "sha256": hashlib.sha256(script).hexdigest(),
+        "size": len(script),
+    }
+    assert [details["response_content_fileinfo"] for details in connections[1:]] == [script_fileinfo] * 3
+    assert sorted(written) == sorted({details["response_content_fileinfo"]["sha256"] for details in connections})
+
+    deduplication = next(section for section in task.result.sections if section.title_text == "Deduplicated Content")
+    assert json.loads(deduplication.body) == {"Duplicate responses": 2, "Duplicate bytes": 2 * len(script)}
+
+
+def test_execute_identifies_bodies_in_order(monkeypatch, caplog):
+    bodies = [f"var resource{index} = {index};\n".encode() * 16 for index in range(1, 4)]
+    har = generate_har(URL, 4)
+    for index, body in enumerate(bodies, 1):
+        har["log"]["entries"][index]["response"]["content"] = {
+            "size": len(body),
+            "mimeType": "application/javascript",
+            "text": body.decode(),
+        }
+
+    identified = []
+    identify_type = Lookyloo._identify_type
+
+    def identify_or_fail(self, path):
+        with open(path, "rb") as f:
+            body = f.read()
+        if body == bodies[1]:
+            raise OSError("unreadable")
+        identified.append(body)
+        # Whatever identify reports, the digests of the body are kept
+        return {**identify_type(self, path), "sha256": "0" * 64}
+
+    monkeypatch.setattr(Lookyloo, "_identify_type", identify_or_fail)
+    with StandInLookyloo() as server:
+        server.add_capture(URL, generate_export(URL, 4, har=har))
+        _, task, _ = execute_capture(server.url, URL)
+
+    # The page at the submitted URL is found first
+    assert identified[1:] == [bodies[0], bodies[2]]
+    assert f"Could not identify the content from {URL}resource/2: unreadable" in caplog.text
+
+    # The content that could not be identified is still listed, every body with its own digest
+    downloaded = next(section for section in task.result.sections if section.title_text == "Downloaded Content")
+    rows = json.loads(downloaded.body)
+    assert [row["url"] for row in rows] == [URL] + [f"{URL}resource/{index}" for index in range(1, 4)]
+    assert [row["SHA256"] for row in rows[1:]] == [hashlib.sha256(body).hexdigest() for body in bodies]
+
+
+class FakeLacus:
+    def __init__(self, started):
+        self.started = started
+
+    def zscore(self, _key, _uuid):
+        return self.started
+
+    def close(self):
+        pass
+
+
+def test_execute_reports_browser_launch(monkeypatch):
+    # The generated session log opens its page at 2024-01-01T00:00:00Z
+    started = datetime(2023, 12, 31, 23, 59, 58, tzinfo=UTC).timestamp()
+    start = Lookyloo.start
+
+    def start_with_lacus(self):
+        start(self)
+        self.lacus_redis = FakeLacus(started)
+
+    monkeypatch.setattr(Lookyloo, "start", start_with_lacus)
+    with StandInLookyloo(ongoing_for=0.2) as server:
+        server.add_capture(URL, generate_export(URL, 3))
+        _, _, phases = execute_capture(server.url, URL)
+
+    assert phases["browser launch"] == pytest.approx(2)
+
+
+@pytest.mark.parametrize("config", [{"ontology_mode": "minimal"}, {"har_compression": "lzma"}])
+def test_start_rejects_unknown_settings(config):
+    # Before anything is captured
+    with pytest.raises(ValueError):
+        Lookyloo(config).start()
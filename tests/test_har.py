@@ -0,0 +1,94 @@
+import base64
+import gzip
+import hashlib
+import io
+import json
+
+import pytest
+
+from lookyloo.har import HarRewriter, decode_content, open_har_output
+
+HAR = {
+    "log": {
+        "version": "1.2",
+        "creator": {"name": "Playwright", "version": "1.49.0"},
+        "entries": [
+            {
+                "request": {"method": "GET", "url": "https://example.com/"},
+                "response": {"status": 200, "content": {"size": 5, "text": "aGVsbG8=", "encoding": "base64"}},
+                "time": 12.5,
+            },
+            {
+                "request": {"method": "GET", "url": "https://example.com/favicon.ico"},
+                "response": {"status": 404, "content": {"size": 0}},
+                "time": 1,
+            },
+        ],
+        "pages": [{"startedDateTime": "2024-01-01T00:00:00.000Z", "id": "page@1"}],
+    }
+}
+
+
+def test_rewriter_streams_entries_and_keeps_log_fields():
+    destination = io.StringIO()
+    har = HarRewriter(io.BytesIO(json.dumps(HAR).encode()), destination)
+
+    urls = []
+    for entry in har.entries():
+        urls.append(entry["request"]["url"])
+        entry["response"]["content"].pop("text", None)
+
+    assert urls == ["https://example.com/", "https://example.com/favicon.ico"]
+    assert har.log == {key: value for key, value in HAR["log"].items() if key != "entries"}
+
+    rewritten = json.loads(destination.getvalue())
+    assert list(rewritten["log"]) == ["version", "creator", "entries", "pages"]
+    assert rewritten["log"]["entries"][0]["response"]["content"] == {"size": 5, "encoding": "base64"}
+    assert rewritten["log"]["entries"][0]["time"] == pytest.approx(12.5)
+    assert rewritten["log"]["entries"][1] == HAR["log"]["entries"][1]
+
+
+def test_rewriter_empty_entries():
+    destination = io.StringIO()
+    har = HarRewriter(io.BytesIO(b'{"log": {"entries": [], "pages": []}}'), destination)
+    assert list(har.entries()) == []
+    assert json.loads(destination.getvalue()) == {"log": {"entries": [], "pages": []}}
+
+
+@pytest.mark.parametrize("compression, extension, open_output", [("none", "", open), ("gzip", ".gz", gzip.open)])
+def test_open_har_output(tmp_path, compression, extension, open_output):
+    path = str(tmp_path / "session.har")
+    with open_har_output(path, compression, level=1) as destination:
+        har = HarRewriter(io.BytesIO(json.dumps(HAR).encode()), destination)
+        for _ in har.entries():
+            pass
+    with open_output(path + extension, "rt") as f:
+        assert json.load(f) == HAR
+
+    with pytest.raises(ValueError):
+        open_har_output(path, "lzma")
+
+
+@pytest.mark.parametrize(
+    "content, content_text, encoding",
+    [
+        (b"hello", "aGVsbG8=", "base64"),
+        # Line breaks are not strict base64
+        (b"hello world", "aGVsbG8g\nd29ybGQ=", "base64"),
+        # Not base64 at all, kept as is
+        (b"not base64!", "not base64!", "base64"),
+        ("<html>é</html>".encode(), "<html>é</html>", None),
+        (bytes(range(256)) * 4096, base64.b64encode(bytes(range(256)) * 4096).decode(), "base64"),
+    ],
+)
+def test_decode_content(content, content_text, encoding):
+    destination = io.BytesIO()
+    digests = decode_content(content_text, encoding, destination)
+    assert destination.getvalue() == content
+    assert digests == {
+        "md5": hashlib.md5(content).hexdigest(),
+        "sha1": hashlib.sha1(content).hexdigest(),
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "size": len(content),
+    }
+    assert decode_content(content_text, encoding) == digests
@@ -0,0 +1,69 @@
+import io
+import os
+import random
+
+from PIL import Image
+
+from lookyloo.images import dhash, favicon_info, process_screenshot
+
+
+def encode(image, format="PNG"):
+    output = io.BytesIO()
+    image.save(output, format=format)
+    return output.getvalue()
+
+
+def gradient(width, height):
+    image = Image.new("RGB", (width, height))
+    image.putdata([(x * 255 // width, y * 255 // height, 128) for y in range(height) for x in range(width)])
+    return image
+
+
+def test_dhash():
+    image = gradient(200, 100)
+    assert len(dhash(image)) == 16
+    # A smaller copy looks the same
+    assert dhash(image) == dhash(image.resize((100, 50)))
+    assert dhash(image) != dhash(image.transpose(Image.Transpose.FLIP_LEFT_RIGHT))
+
+
+def test_small_screenshot_is_written_as_is(tmp_path):
+    data = encode(gradient(64, 128))
+    path = str(tmp_path / "0.png")
+    processed = process_screenshot(data, path, max_dimension=1024, max_size=len(data))
+    assert processed.original_dimensions is None
+    assert processed.dimensions == (64, 128)
+    assert processed.dhash
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_large_screenshot_is_downsampled(tmp_path):
+    data = encode(gradient(100, 400))
+    path = str(tmp_path / "0.png")
+    processed = process_screenshot(data, path, max_dimension=200)
+    assert processed.original_dimensions == (100, 400)
+    assert processed.dimensions == (50, 200)
+    with Image.open(path) as image:
+        assert image.size == (50, 200)
+
+    # Noise does not compress, so its size follows the number of pixels
+    data = encode(Image.frombytes("RGB", (200, 200), random.Random(0).randbytes(200 * 200 * 3)))
+    processed = process_screenshot(data, path, max_size=len(data) // 4)
+    assert processed.size <= len(data) // 4
+    assert processed.size == os.path.getsize(path)
+
+
+def test_invalid_screenshot(tmp_path):
+    path = str(tmp_path / "0.png")
+    processed = process_screenshot(b"not an image", path, max_dimension=10, max_size=1)
+    assert processed.dhash is None
+    with open(path, "rb") as f:
+        assert f.read() == b"not an image"
+
+
+def test_favicon_info():
+    info = favicon_info(encode(gradient(32, 32).convert("P"), format="ICO"))
+    assert len(info["sha256"]) == 64
+    assert len(info["dhash"]) == 16
+    assert "dhash" not in favicon_info(b"<svg></svg>")
@@ -0,0 +1,67 @@
+import random
+import re
+
+import pytest
+
+from lookyloo.matching import UrlMatcher, host_key, literal_prefixes
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        (r"^https://google\.com/", ["https://google.com/"]),
+        (
+            r"https?://(www\.)?example\.com/",
+            [f"{scheme}://{www}example.com/" for scheme in ["http", "https"] for www in ["", "www."]],
+        ),
+        (r"http://[ab]\.com", ["http://a.com", "http://b.com"]),
+        (r".*\.evil\.com", [""]),
+        (r"http://[a-z]+\.com/", ["http://"]),
+        (r"http://(a|b|c|d|e)(f|g|h|i|j)\.com/", None),
+    ],
+)
+def test_literal_prefixes(pattern, expected):
+    prefixes = literal_prefixes(pattern)
+    assert (sorted(prefixes) if prefixes is not None else None) == (sorted(expected) if expected else expected)
+
+
+@pytest.mark.parametrize(
+    "url, complete, expected",
+    [
+        ("https://example.com/path", True, "https://example.com"),
+        ("https://example.com", True, "https://example.com"),
+        ("https://example.com", False, None),
+        ("https://user@example.com:8080/", True, "https://user"),
+        ("example.com/path", True, None),
+    ],
+)
+def test_host_key(url, complete, expected):
+    assert host_key(url, complete) == expected
+
+
+def test_url_matcher_matches_like_each_pattern():
+    rng = random.Random(0)
+    hosts = ["example.com", "www.example.com", "evil.org", "a.b.net", "Example.com"]
+    patterns = [
+        r"https?://(www\.)?example\.com/",
+        r"https://evil\.org/download/.*\.exe",
+        r"http://a\.b\.net:8080/",
+        r".*\.org/",
+        r"(?i)https://EXAMPLE\.com/admin",
+        r"https://(?P<host>evil)\.org/(?P=host)",
+        r"https://a\.b\.net",
+        r"(?P<scheme>http)://evil\.org/",
+        r"(?P<scheme>https)://evil\.org/x",
+    ]
+    matcher = UrlMatcher(patterns)
+    compiled = [re.compile(pattern) for pattern in patterns]
+    for _ in range(2000):
+        url = (
+            f"{rng.choice(['http', 'https'])}://{rng.choice(hosts)}{rng.choice(['', ':8080'])}"
+            f"{rng.choice(['', '/', '/download/a.exe', '/admin', '/evil'])}"
+        )
+        assert matcher.match(url) == any(pattern.match(url) for pattern in compiled), url
+
+
+def test_url_matcher_empty():
+    assert not UrlMatcher([]).match("https://example.com/")
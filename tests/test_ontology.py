@@ -0,0 +1,85 @@
+import pytest
+
+from lookyloo.ontology import ConnectionCollector
+
+
+def make_details(url, method="GET", status=200, sha256=None):
+    details = {
+        "request_uri": url,
+        "request_headers": {"User-Agent": "test"},
+        "request_method": method,
+        "response_headers": {"Content-Type": "text/html"},
+        "response_status_code": status,
+    }
+    if sha256:
+        details["response_content_fileinfo"] = {"md5": "", "sha1": "", "sha256": sha256, "size": 1}
+    return details
+
+
+def test_full_mode_keeps_everything():
+    collector = ConnectionCollector()
+    for _ in range(2):
+        collector.add(make_details("https://example.com/", sha256="a"))
+    collector.add(make_details("https://cdn.example.com/lib.js", sha256="b"))
+
+    parts = collector.parts({"https://example.com/"})
+    assert len(parts) == 3
+    assert all(part["http_details"]["request_headers"] for part in parts)
+    assert all(part["connection_type"] == "http" for part in parts)
+    assert (collector.deduplicated, collector.summarized, collector.overflow) == (0, 0, 0)
+
+
+def test_compact_mode():
+    collector = ConnectionCollector("compact")
+    collector.add(make_details("https://example.com/", sha256="a"))
+    collector.add(make_details("https://cdn.example.com/lib.js", sha256="b"))
+    collector.add(make_details("https://cdn.example.com/lib.js", sha256="b"))
+    # Same request, but a different answer
+    collector.add(make_details("https://cdn.example.com/lib.js", sha256="c"))
+    collector.add(make_details("https://cdn.example.com/lib.js", method="POST", sha256="b"))
+
+    parts = collector.parts({"https://example.com/"})
+    assert [part["http_details"]["request_uri"] for part in parts] == [
+        "https://example.com/",
+        "https://cdn.example.com/lib.js",
+        "https://cdn.example.com/lib.js",
+        "https://cdn.example.com/lib.js",
+    ]
+    assert parts[0]["http_details"]["request_headers"] == {"User-Agent": "test"}
+    assert all(part["http_details"]["request_headers"] == {} for part in parts[1:])
+    assert all(part["http_details"]["response_headers"] == {} for part in parts[1:])
+    assert parts[1]["http_details"]["response_content_fileinfo"]["sha256"] == "b"
+    assert (collector.deduplicated, collector.summarized, collector.overflow) == (1, 3, 0)
+
+
+def test_limit_keeps_the_chain():
+    collector = ConnectionCollector(max_parts=3)
+    for index in range(5):
+        collector.add(make_details(f"https://cdn.example.com/{index}.js"))
+    collector.add(make_details("https://example.com/"))
+    collector.add(make_details("https://www.example.com/"))
+
+    parts = collector.parts({"https://example.com/", "https://www.example.com/"})
+    assert [part["http_details"]["request_uri"] for part in parts] == [
+        "https://cdn.example.com/0.js",
+        "https://example.com/",
+        "https://www.example.com/",
+    ]
+    assert collector.overflow == 4
+
+
+def test_limit_caps_the_chain():
+    collector = ConnectionCollector(max_parts=2)
+    # A redirect loop
+    for _ in range(3):
+        collector.add(make_details("https://example.com/"))
+    collector.add(make_details("https://cdn.example.com/lib.js"))
+
+    parts = collector.parts({"https://example.com/"})
+    assert [part["http_details"]["request_uri"] for part in parts] == ["https://example.com/"] * 2
+    assert collector.overflow == 2
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        ConnectionCollector("minimal")
@@ -0,0 +1,91 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from lookyloo.page import content_charset, find_webdav_links, scan_html
+
+LISTING = b"""<html><head><title>Index of /files</title></head><body><h1>Index of /files</h1>
+<a href="?C=N;O=D">Name</a><a href="/">Parent Directory</a><a href="document.pdf">document.pdf</a>
+<a href="folder/">folder/</a><a>No link</a></body></html>"""
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        LISTING,
+        b"<html><head><title>Welcome</title></head><body><a href='https://example.com/'>Link</a></body></html>",
+        b"<html><head><title></title></head><body></body></html>",
+        b"<html><body><a href='a.txt'>a</a><svg><title>Index of icons</title></svg></body></html>",
+        b"<p>No structure at all",
+        b"",
+        # No charset declared, and characters split between chunks
+        "<html><head><title>Index of Café — Привет</title></head><body><a href='файл.txt'>f</a></body></html>".encode(),
+    ],
+)
+def test_scan_html_matches_soup(data):
+    page = scan_html(data, chunk_size=16, encoding="utf-8")
+    soup = BeautifulSoup(data, features="lxml")
+
+    assert page.title == (soup.title.string if soup.title else None)
+    if page.complete:
+        assert page.hrefs == [a["href"] for a in soup.find_all("a", href=True)]
+
+
+def test_scan_html_stops_early():
+    data = b"<html><head><title>Welcome</title></head><body>" + b"<a href='x'>x</a>" * 100000 + b"</body></html>"
+    page = scan_html(data)
+    assert page.title == "Welcome"
+    assert not page.complete
+    assert not page.is_directory_listing
+
+
+def test_scan_html_listing():
+    page = scan_html(LISTING)
+    assert page.is_directory_listing
+    assert page.complete
+    assert page.hrefs == ["?C=N;O=D", "/", "document.pdf", "folder/"]
+
+
+def test_find_webdav_links():
+    content = b"""<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">
+<d:response><d:href>/dav/</d:href></d:response><d:response><d:href>/dav/file.txt</d:href></d:response>
+</d:multistatus>"""
+    assert find_webdav_links(content) == ["/dav/", "/dav/file.txt"]
+    assert find_webdav_links(b"<rss><channel></channel></rss>") == []
+
+
+@pytest.mark.parametrize(
+    "title, content_type",
+    [
+        ("Café", "text/html; charset=windows-1252"),
+        ("索引", "text/html; charset=euc-jp"),
+        ("索引", "text/html; charset=ISO-2022-JP"),
+        ("색인", "text/html; charset=euc-kr"),
+        ("색인", "text/html; charset=KS_C_5601-1987"),
+    ],
+)
+def test_scan_html_declared_encoding(title, content_type):
+    encoding = content_charset(content_type)
+    data = f"<html><head><title>{title}</title></head></html>".encode(encoding)
+    assert scan_html(data, encoding=encoding).title == title
+
+
+def test_scan_html_unknown_encoding():
+    # Left to the page, or Latin-1
+    assert scan_html(b"<html><head><title>Caf\xe9</title></head></html>", encoding="unknown").title == "Café"
+
+
+@pytest.mark.parametrize(
+    "content_type, expected",
+    [
+        ("text/html; charset=UTF-8", "utf-8"),
+        ('text/html;Charset="windows-1252"', "cp1252"),
+        ("text/html; charset=euc-jp", "euc_jp"),
+        ("text/html; charset=EUC-KR", "euc_kr"),
+        ("text/html; charset=KS_C_5601-1987", "euc_kr"),
+        ("text/html", None),
+        ("text/html; charset=unknown", None),
+        (None, None),
+    ],
+)
+def test_content_charset(content_type, expected):
+    assert content_charset(content_type) == expected
@@ -0,0 +1,56 @@
+import pytest
+
+from lookyloo.redirects import RedirectGraph, find_header, parse_refresh_header
+
+
+def make_entry(url, status, headers=(), redirect_url=""):
+    return {
+        "request": {"url": url},
+        "response": {
+            "status": status,
+            "headers": [{"name": name, "value": value} for name, value in headers],
+            "redirectURL": redirect_url,
+        },
+        "serverIPAddress": "127.0.0.1",
+    }
+
+
+def test_find_header():
+    headers = [{"name": "location", "value": "/first"}, {"name": "LOCATION", "value": "/second"}]
+    assert find_header(headers, "Location") == "/second"
+    assert find_header(headers, "Refresh") is None
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("0;url=https://example.com/", "https://example.com/"),
+        ("5; URL=https://example.com/", "https://example.com/"),
+        ("60;url=https://example.com/", ""),
+        ("invalid", ""),
+    ],
+)
+def test_parse_refresh_header(value, expected):
+    assert parse_refresh_header(value) == expected
+
+
+def test_redirect_graph_out_of_order():
+    graph = RedirectGraph(["http://a/"])
+    # The second hop of the chain is logged before the first one
+    graph.add_entry(make_entry("http://b/", 302, [("location", "http://c/")]))
+    graph.add_entry(make_entry("http://a/", 301, redirect_url="http://b/"))
+    graph.add_entry(make_entry("http://c/", 200, [("Refresh", "0;url=http://d/")]))
+    graph.add_entry(make_entry("http://ad/", 302, [("Location", "http://tracker/")]))
+
+    chain_urls = graph.chain_urls()
+    assert chain_urls == {"http://a/", "http://b/", "http://c/", "http://d/"}
+    main, secondary = graph.split(chain_urls)
+    assert [redirect["redirecting_url"] for redirect in main] == ["http://b/", "http://a/", "http://c/"]
+    assert [redirect["redirecting_to"] for redirect in secondary] == ["http://tracker/"]
+
+
+def test_redirect_graph_refresh_on_redirect():
+    graph = RedirectGraph(["http://a/"])
+    graph.add_entry(make_entry("http://a/", 302, [("refresh", "0;url=http://b/")]))
+    graph.add_entry(make_entry("http://b/", 302))
+    assert [redirect["redirecting_to"] for redirect in graph.redirects] == ["http://b/", "Not Available"]
@@ -0,0 +1,81 @@
+import pytest
+
+from lookyloo.safelist import SafelistCache
+
+
+class FakeServiceAPI:
+    def __init__(self, safelisted=()):
+        self.safelisted = set(safelisted)
+        self.lookups = []
+
+    def lookup_safelist(self, qhash):
+        self.lookups.append(qhash)
+        if qhash in self.safelisted:
+            return {"enabled": True, "type": "file", "hashes": {"sha256": qhash}, "sources": []}
+        return None
+
+
+def test_verdicts_are_cached():
+    api = FakeServiceAPI(safelisted=["safe"])
+    cache = SafelistCache(api, ttl=60, max_entries=10)
+    for _ in range(3):
+        assert cache.lookup_safelist("safe") == {"enabled": True, "type": "file"}
+        assert cache.lookup_safelist("unknown") is None
+    assert api.lookups == ["safe", "unknown"]
+    assert (cache.hits, cache.misses) == (4, 2)
+    assert cache.hit_rate == pytest.approx(4 / 6)
+
+
+def test_expiry_and_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("lookyloo.safelist.time.time", lambda: now[0])
+    api = FakeServiceAPI()
+    cache = SafelistCache(api, ttl=60, max_entries=2)
+    cache.lookup_safelist("a")
+    cache.lookup_safelist("b")
+    cache.lookup_safelist("a")
+    # "b" is the least recently used
+    cache.lookup_safelist("c")
+    cache.lookup_safelist("b")
+    assert api.lookups == ["a", "b", "c", "b"]
+
+    now[0] += 61
+    cache.lookup_safelist("b")
+    assert api.lookups[-1] == "b"
+    assert cache.misses == 5
+
+
+def test_errors_are_not_cached():
+    class FailingServiceAPI(FakeServiceAPI):
+        def lookup_safelist(self, qhash):
+            super().lookup_safelist(qhash)
+            raise ConnectionError()
+
+    api = FailingServiceAPI()
+    cache = SafelistCache(api, ttl=60, max_entries=10)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            cache.lookup_safelist("a")
+    assert api.lookups == ["a", "a"]
+
+
+def test_verdicts_kept_on_disk(tmp_path):
+    path = str(tmp_path / "safelist.db")
+    cache = SafelistCache(FakeServiceAPI(safelisted=["safe"]), ttl=60, max_entries=10, path=path)
+    cache.lookup_safelist("safe")
+    cache.lookup_safelist("unknown")
+    cache.close()
+
+    api = FakeServiceAPI()
+    cache = SafelistCache(api, ttl=60, max_entries=10, path=path)
+    assert cache.lookup_safelist("safe") == {"enabled": True, "type": "file"}
+    assert cache.lookup_safelist("unknown") is None
+    assert api.lookups == []
+    cache.close()
+
+    # Only the most recent verdicts are loaded back
+    cache = SafelistCache(api, ttl=60, max_entries=1, path=path)
+    cache.lookup_safelist("unknown")
+    cache.lookup_safelist("safe")
+    assert api.lookups == ["safe"]
+    cache.close()
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from lookyloo.startup import (
+    GENERIC_CONFIG_FILE,
+    VERSION_FILE,
+    configure_lookyloo,
+    read_lookyloo_version,
+    wait_until_ready,
+)
+
+
+def test_read_lookyloo_version_from_file(tmp_path):
+    (tmp_path / VERSION_FILE).write_text("1.2.3\n")
+    assert read_lookyloo_version(str(tmp_path)) == "1.2.3"
+
+
+def test_read_lookyloo_version_from_metadata(tmp_path):
+    dist_info = tmp_path / ".venv" / "lib" / "python3.11" / "site-packages" / "lookyloo-4.5.6.dist-info"
+    dist_info.mkdir(parents=True)
+    (dist_info / "METADATA").write_text("Metadata-Version: 2.1\nName: lookyloo\nVersion: 4.5.6\n")
+    assert read_lookyloo_version(str(tmp_path)) == "4.5.6"
+
+
+def test_wait_until_ready():
+    probes = iter([False, False, True])
+    waits = []
+    wait_until_ready(lambda: next(probes), timeout=5, interval=0, on_wait=waits.append)
+    assert len(waits) == 2
+
+
+def test_wait_until_ready_timeout():
+    with pytest.raises(TimeoutError):
+        wait_until_ready(lambda: False, timeout=0.05, interval=0.01)
+
+
+def test_configure_lookyloo(tmp_path):
+    config_path = tmp_path / GENERIC_CONFIG_FILE
+    config_path.parent.mkdir()
+    (tmp_path / f"{GENERIC_CONFIG_FILE}.sample").write_text(json.dumps({"async_capture_processes": 1, "loglevel": 20}))
+
+    assert configure_lookyloo({"async_capture_processes": 2}, str(tmp_path)) == []
+    assert json.loads(config_path.read_text()) == {"async_capture_processes": 2, "loglevel": 20}
+
+    # The existing configuration is kept, unknown settings are not written
+    config_path.write_text(json.dumps({"async_capture_processes": 2, "loglevel": 10}))
+    assert configure_lookyloo({"browser_pool": 4, "loglevel": 30}, str(tmp_path)) == ["browser_pool"]
+    assert json.loads(config_path.read_text()) == {"async_capture_processes": 2, "loglevel": 30}
@@ -0,0 +1,33 @@
+import math
+
+from lookyloo.timing import PhaseHistogram, PhaseTimer
+
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    timer.lap("first")
+    timer.lap("second")
+    timer.lap("first")
+    assert list(timer.phases) == ["first", "second"]
+    assert math.isclose(timer.total, sum(timer.phases.values()))
+
+    # Details are reported, but not counted in the total
+    timer.details["within first"] = 10
+    assert "within first=10.00s" in str(timer)
+    assert math.isclose(timer.total, sum(timer.phases.values()))
+
+    timer.mark("event", 123)
+    timer.mark("now")
+    assert timer.marks["event"] == 123
+    assert timer.marks["now"] > 123
+
+
+def test_phase_histogram():
+    histogram = PhaseHistogram()
+    for duration in [0.2, 0.3, 0.4, 1.5, 200]:
+        histogram.observe({"capture": duration})
+    assert histogram.tasks == 5
+    assert math.isclose(histogram.quantile("capture", 0.5), 0.5)
+    assert histogram.quantile("capture", 0.8) == 2
+    assert histogram.quantile("capture", 1) == float("inf")
+    assert "capture: n=5" in histogram.summary()